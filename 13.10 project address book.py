@@ -24,13 +24,157 @@ zipcodes_and_cities.txt:    a txt-file which contains almost all zipcodes in Fin
                             addresses in Finland, however to expand the program one would only
                             need to add another txt-file with the same formatting.
 
+Command line options:
+--check:                    checks every row of address_book.txt against zipcodes_and_cities.txt
+                            and prints the malformed rows, unknown zip codes and wrong cities
+                            with their line numbers. Large address books are checked in
+                            parallel chunks.
+--repair:                   like --check, but also fixes the rows which can be fixed. Rows
+                            which cannot be fixed are moved to address_book.txt.rejected.
+--lazy:                     shows the window right away and loads a large address book in the
+                            background. Pages show the contacts loaded so far and are marked
+                            partial, and a search loads the rest of the file until the contact
+                            is found.
+
+--shards N:                 divides the address book into N files in the address_book_shards
+                            directory. The files are loaded and saved in parallel, and a save
+                            only writes the files with changed contacts. On the first run the
+                            contacts are copied from address_book.txt, which is then renamed to
+                            address_book.txt.imported. Once the address book is sharded, the
+                            program must always be run with --shards, and --check and --repair
+                            cannot be used. --partition surname (the default) divides the
+                            contacts by surname, --partition zip by the region of their zip code.
+--keyfile KEYFILE:          stores the address book encrypted in address_book.enc with the key
+                            in KEYFILE (create one with --create-keyfile KEYFILE). --passphrase
+                            asks for a passphrase instead. The file is encrypted in chunks with
+                            AES-GCM while it is written, which needs the cryptography package.
+                            The first time, the contacts are read from address_book.txt, which
+                            is removed once they have been saved encrypted. The changes are not
+                            written to address_book_events.log, only served with --events-port.
+                            --check and --repair also take --keyfile or --passphrase.
+--benchmark-encryption N:   measures how much slower saving and loading N contacts is encrypted.
+--events-port PORT:         serves the changes made to the address book on a local socket.
+--tail-events SEQUENCE:     prints the changes made to the address book after the given sequence
+                            number and keeps printing new ones. The changes are read from the
+                            socket if --events-port is given, otherwise from the event log.
+
+zipcodes_coordinates.txt:   an optional txt-file with the coordinates of the zip codes, one
+                            "zipcode;latitude;longitude" row per zip code in decimal degrees. It
+                            is not included; with it the Find Nearby page lists the contacts
+                            within a distance of a zip code, or the contacts nearest to it.
+
+address_book_events.log:    every change made to the address book is appended to this file as a
+                            row of JSON with a growing sequence number and the contact before
+                            and after the change.
+
+Keyboard shortcuts:
+Ctrl+K:                     opens the command palette, which searches the actions and the
+                            contacts (by name or city) while typing.
+
 Name: Sophie Tötterström
 Student ID: 050102822
 Email: sophie.totterstrom@tuni.fi
 """
 
 from tkinter import *
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter, OrderedDict
+from collections.abc import MutableMapping
+import argparse
+import bisect
+import getpass
+import glob
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
 import time
+import zlib
+
+# The cryptography package is optional. It is only needed for the encrypted address book.
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+# Names of the data files the program reads and writes.
+ADDRESS_BOOK_FILENAME = "address_book.txt"
+ZIPCODES_FILENAME = "zipcodes_and_cities.txt"
+COORDINATES_FILENAME = "zipcodes_coordinates.txt"
+EVENT_LOG_FILENAME = "address_book_events.log"
+SHARD_DIRECTORY = "address_book_shards"
+ENCRYPTED_ADDRESS_BOOK_FILENAME = "address_book.enc"
+
+# Suffix of the unsharded address book file once it has been imported into shards.
+IMPORTED_SUFFIX = ".imported"
+
+# The address book file has five semicolon separated fields per row.
+ADDRESS_BOOK_FIELD_COUNT = 5
+
+# Number of rows parsed before the window is shown, and per step of the
+# event loop afterwards, when the address book is loaded lazily.
+LAZY_LOAD_FIRST_CHUNK = 1000
+LAZY_LOAD_CHUNK_SIZE = 5000
+
+# Finnish zip codes are grouped into regions by their first two digits.
+ZIP_REGION_PREFIX_LENGTH = 2
+
+# Number of rows shown in each top list of the statistics page.
+STATISTICS_TOP_COUNT = 10
+
+# The command palette shows at most this many results, and waits this many
+# milliseconds after a keystroke before searching. Keystrokes of fast typing
+# come closer together than that, so only the latest one is searched.
+PALETTE_RESULT_COUNT = 15
+PALETTE_DELAY_MS = 40
+
+# Size in kilometres of the grid cells of the zip code coordinates, and the
+# mean radius of the Earth used for the distances.
+GRID_CELL_SIZE_KM = 10.0
+EARTH_RADIUS_KM = 6371.0
+
+# The encrypted address book starts with a header of the format name and the
+# salt of the passphrase. It is followed by chunks, each encrypted and
+# authenticated on its own: a final-chunk flag, the length of the encrypted
+# data, the nonce and the encrypted data.
+ENCRYPTION_MAGIC = b"ADDRESSBOOK-AESGCM-1"
+ENCRYPTION_SALT_SIZE = 16
+ENCRYPTION_NONCE_SIZE = 12
+ENCRYPTION_KEY_SIZE = 32
+ENCRYPTION_CHUNK_SIZE = 64 * 1024
+ENCRYPTION_CHUNK_HEADER = struct.Struct(">?I")
+
+# Largest run of the command palette's search index which is made by merging
+# smaller runs. Merging takes a few milliseconds per 100 000 entries.
+SEARCH_INDEX_RUN_SIZE = 100000
+
+# Number of page slices and search results kept in the result cache.
+RESULT_CACHE_SIZE = 256
+
+# Mutation events are delivered to the subscribers in batches. A batch is
+# delivered when it is full, or at the latest this many milliseconds after
+# its first event.
+EVENT_BATCH_SIZE = 100
+EVENT_FLUSH_DELAY_MS = 50
+
+# Ways of dividing a sharded address book into shards.
+PARTITION_BY_SURNAME = "surname"
+PARTITION_BY_ZIP_REGION = "zip"
+
+# Kinds of mutation events.
+EVENT_ADD = "add"
+EVENT_EDIT = "edit"
+EVENT_DELETE = "delete"
 
 
 class ContactCard:
@@ -57,16 +201,1527 @@ class ContactCard:
         self.city = city
 
 
+class AddressBookStatistics:
+    """
+    This class keeps count of the contacts per city and per zip code region.
+    The counters are updated whenever a contact is added or removed, so the
+    statistics never need a scan of the whole address book.
+    """
+
+    def __init__(self):
+        """
+        Counters are Counter objects of city / region -> number of contacts.
+        Cities and regions without contacts are removed from the counters.
+        """
+        self.number_of_contacts = 0
+        self.cities = Counter()
+        self.regions = Counter()
+
+    def add(self, contact):
+        """
+        Counts a contact which was added to the address book.
+        :param contact: ContactCard object
+        """
+        self.number_of_contacts += 1
+        self.cities[contact.city] += 1
+        self.regions[contact.zip_code[:ZIP_REGION_PREFIX_LENGTH]] += 1
+
+    def remove(self, contact):
+        """
+        Stops counting a contact which was removed from the address book.
+        :param contact: ContactCard object
+        """
+        self.number_of_contacts -= 1
+        self.__decrement(self.cities, contact.city)
+        self.__decrement(self.regions, contact.zip_code[:ZIP_REGION_PREFIX_LENGTH])
+
+    def __decrement(self, counter, name):
+        """
+        Decrements a counter and removes the name when nothing is left.
+        """
+        counter[name] -= 1
+        if counter[name] <= 0:
+            del counter[name]
+
+    def recompute(self, contacts):
+        """
+        Recounts the statistics from scratch. Counter counts in C, which is
+        faster than copying the names into NumPy arrays first.
+        :param contacts: iterable of ContactCard objects
+        """
+        cities = []
+        regions = []
+        for contact in contacts:
+            cities.append(contact.city)
+            regions.append(contact.zip_code[:ZIP_REGION_PREFIX_LENGTH])
+
+        self.number_of_contacts = len(cities)
+        self.cities = Counter(cities)
+        self.regions = Counter(regions)
+
+    def top_cities(self, count=STATISTICS_TOP_COUNT):
+        """
+        :return: list of (city, number of contacts) tuples, most contacts first
+        """
+        return self.cities.most_common(count)
+
+    def top_regions(self, count=STATISTICS_TOP_COUNT):
+        """
+        :return: list of (zip code prefix, number of contacts) tuples, most contacts first
+        """
+        return self.regions.most_common(count)
+
+
+class ContactSearchIndex:
+    """
+    This class is a prefix search index of the contacts for the command palette.
+    Every contact is indexed by its full name in both orders and by its city.
+    The index is a few sorted lists of "term\0key" strings, so a prefix search is
+    a binary search in each list. New contacts go into a small list of their own,
+    and small lists are merged together, so adding contacts never moves the whole
+    index like inserting into one big list would.
+    """
+
+    def __init__(self):
+        """
+        Each run is a sorted list of entries. "\0" separates the term from the key and
+        sorts before every other character, so the terms of a prefix are adjacent.
+        """
+        self.__runs = []
+
+    def __terms(self, contact):
+        """
+        :return: the lower case terms a contact is found with, list of str
+        """
+        return [f"{contact.first_name} {contact.last_name}".lower(),
+                f"{contact.last_name} {contact.first_name}".lower(),
+                contact.city.lower()]
+
+    def rebuild(self, address_book):
+        """
+        Builds the index from scratch.
+        :param address_book: dict of address book keys and ContactCard objects
+        """
+        entries = [f"{term}\0{key}"
+                   for key, contact in address_book.items()
+                   for term in self.__terms(contact)]
+        entries.sort()
+        self.__runs = [entries] if entries else []
+
+    def add(self, key, contact):
+        """
+        Adds a contact to the index.
+        :param key: address book key of the contact, str
+        :param contact: ContactCard object
+        """
+        self.add_many([(key, contact)])
+
+    def add_many(self, contacts):
+        """
+        Adds contacts to the index as a new run. Like in a binary counter, the last
+        run is merged into the one before it while they are about the same size, but
+        never beyond SEARCH_INDEX_RUN_SIZE entries, so a merge takes a bounded time.
+        :param contacts: list of (address book key, ContactCard object) tuples
+        """
+        run = sorted(f"{term}\0{key}" for key, contact in contacts for term in self.__terms(contact))
+        if not run:
+            return
+        self.__runs.append(run)
+
+        while len(self.__runs) >= 2 and len(self.__runs[-2]) <= 2 * len(self.__runs[-1]) and \
+                len(self.__runs[-2]) + len(self.__runs[-1]) <= SEARCH_INDEX_RUN_SIZE:
+            run = self.__runs.pop()
+
+            # sort() finds the two sorted halves and merges them.
+            self.__runs[-1].extend(run)
+            self.__runs[-1].sort()
+
+    def remove(self, key, contact):
+        """
+        Removes a contact from the index.
+        :param key: address book key of the contact, str
+        :param contact: ContactCard object
+        """
+        for term in self.__terms(contact):
+            entry = f"{term}\0{key}"
+
+            for run in self.__runs:
+                index = bisect.bisect_left(run, entry)
+                if index < len(run) and run[index] == entry:
+                    del run[index]
+                    break
+
+        self.__runs = [run for run in self.__runs if run]
+
+    def __matching_entries(self, run, prefix):
+        """
+        :return: generator of the entries of a run whose term starts with the prefix, in order
+        """
+        index = bisect.bisect_left(run, prefix)
+        while index < len(run) and run[index].startswith(prefix):
+            yield run[index]
+            index += 1
+
+    def search(self, prefix, count=PALETTE_RESULT_COUNT):
+        """
+        Finds the contacts which have a term starting with the prefix.
+        :param prefix: beginning of a name or a city, str
+        :param count: maximum number of contacts returned, int
+        :return: list of address book keys in the order of the terms
+        """
+        prefix = prefix.lower()
+        keys = []
+
+        # The matching entries of every run are merged into one sorted sequence.
+        for entry in heapq.merge(*(self.__matching_entries(run, prefix) for run in self.__runs)):
+            if len(keys) == count:
+                break
+
+            # A contact can match with several terms, but it is listed only once.
+            key = entry[entry.index("\0") + 1:]
+            if key not in keys:
+                keys.append(key)
+
+        return keys
+
+
+class ResultCache:
+    """
+    This class is a bounded cache of page slices and search results, which evicts
+    the least recently used result when it is full. A change to the address book
+    empties the cache and increases the generation, which tells results computed
+    before the change from those computed after it.
+    """
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE):
+        """
+        :param max_size: number of results kept, int
+        """
+        self.max_size = max_size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+        # OrderedDict keeps the results from the least to the most recently used.
+        self.__results = OrderedDict()
+
+    def invalidate(self):
+        """
+        Called when the address book changes. Every cached result becomes stale.
+        """
+        self.generation += 1
+        self.__results.clear()
+
+    def __len__(self):
+        """
+        :return: number of results in the cache, int
+        """
+        return len(self.__results)
+
+    def get(self, key, compute):
+        """
+        Returns the cached result for a key, or computes and caches it.
+        :param key: what the result is for, e.g. ("page", 3), hashable
+        :param compute: function which computes the result
+        :return: the result
+        """
+        key = (self.generation, key)
+
+        if key in self.__results:
+            self.hits += 1
+            self.__results.move_to_end(key)
+            return self.__results[key]
+
+        self.misses += 1
+        result = compute()
+        self.__results[key] = result
+
+        if len(self.__results) > self.max_size:
+            self.__results.popitem(last=False)
+
+        return result
+
+    def hit_rate(self):
+        """
+        :return: share of the lookups which were found in the cache, from 0.0 to 1.0
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# **************************
+# *  Distances             *
+# **************************
+
+def read_zip_code_coordinates(filename=COORDINATES_FILENAME):
+    """
+    Reads the coordinates of the zip codes. Each row of the file has a zip code,
+    the latitude and the longitude of the centre of its area in decimal degrees,
+    separated by semicolons, e.g. "33720;61.4498;23.8570".
+    :param filename: name of the coordinates file, str
+    :return: dict of zip code -> (latitude, longitude)
+    :raises ValueError: if a row is not in the "zipcode;latitude;longitude" format
+    :raises OSError: if the file cannot be read
+    """
+    coordinates = {}
+
+    with open(filename, mode="r", encoding="utf-8-sig") as file:
+        for line_number, row in enumerate(file, start=1):
+            try:
+                zip_code, latitude, longitude = row.rstrip().split(";")
+                coordinates[zip_code] = (float(latitude), float(longitude))
+            except ValueError:
+                raise ValueError(f"line {line_number} is not in the zipcode;latitude;longitude format") from None
+
+    return coordinates
+
+
+def distance_km(first, second):
+    """
+    Calculates the great-circle distance between two points with the haversine formula.
+    :param first: (latitude, longitude) in degrees
+    :param second: (latitude, longitude) in degrees
+    :return: distance in kilometres, float
+    """
+    latitude_1, longitude_1 = map(math.radians, first)
+    latitude_2, longitude_2 = map(math.radians, second)
+
+    a = math.sin((latitude_2 - latitude_1) / 2) ** 2 + \
+        math.cos(latitude_1) * math.cos(latitude_2) * math.sin((longitude_2 - longitude_1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class ContactLocator:
+    """
+    This class finds the contacts near a zip code. The centres of the zip codes
+    are placed into a grid of square cells, so a query only looks at the zip codes
+    in the cells around it instead of every contact. The contacts of each zip code
+    are kept up to date when contacts are added or removed.
+    """
+
+    def __init__(self, coordinates, cell_size_km=GRID_CELL_SIZE_KM):
+        """
+        :param coordinates: dict of zip code -> (latitude, longitude)
+        :param cell_size_km: size of the grid cells in kilometres, float
+        """
+        self.coordinates = coordinates
+        self.cell_size_km = cell_size_km
+
+        # The grid uses an equirectangular projection. Its longitude scale is taken at the
+        # latitude furthest from the equator, so distances on the grid are never longer
+        # than the real distances and a query never skips a cell it needs.
+        furthest_latitude = max((abs(latitude) for latitude, longitude in coordinates.values()), default=0.0)
+        self.__km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+        self.__longitude_scale = math.cos(math.radians(furthest_latitude))
+
+        # Zip codes per grid cell, and address book keys per zip code.
+        self.__cells = {}
+        for zip_code, point in coordinates.items():
+            self.__cells.setdefault(self.__cell_of(point), []).append(zip_code)
+        self.__contacts_by_zip_code = {}
+        self.__number_of_contacts = 0
+
+        # The rows and columns of the grid which have zip codes. Rings of cells are
+        # clipped to them, so the empty cells around the zip codes are never visited.
+        rows = [row for row, column in self.__cells]
+        columns = [column for row, column in self.__cells]
+        self.__first_row, self.__last_row = min(rows, default=0), max(rows, default=0)
+        self.__first_column, self.__last_column = min(columns, default=0), max(columns, default=0)
+
+    def __cell_of(self, point):
+        """
+        :return: (row, column) of the grid cell of a point
+        """
+        latitude, longitude = point
+        return (int(latitude * self.__km_per_degree // self.cell_size_km),
+                int(longitude * self.__km_per_degree * self.__longitude_scale // self.cell_size_km))
+
+    def available(self):
+        """
+        :return: True if the coordinates of the zip codes were loaded, bool
+        """
+        return bool(self.coordinates)
+
+    def rebuild(self, address_book):
+        """
+        Collects the contacts of each zip code from scratch.
+        :param address_book: dict of address book keys and ContactCard objects
+        """
+        self.__contacts_by_zip_code = {}
+        self.__number_of_contacts = 0
+        for key, contact in address_book.items():
+            self.add(key, contact)
+
+    def add(self, key, contact):
+        """
+        :param key: address book key of the contact, str
+        :param contact: ContactCard object
+        """
+        keys = self.__contacts_by_zip_code.setdefault(contact.zip_code, set())
+
+        # Only the contacts with coordinates can be found by a query.
+        if key not in keys and contact.zip_code in self.coordinates:
+            self.__number_of_contacts += 1
+        keys.add(key)
+
+    def remove(self, key, contact):
+        """
+        :param key: address book key of the contact, str
+        :param contact: ContactCard object
+        """
+        keys = self.__contacts_by_zip_code.get(contact.zip_code)
+        if keys is not None and key in keys:
+            keys.remove(key)
+            if contact.zip_code in self.coordinates:
+                self.__number_of_contacts -= 1
+            if not keys:
+                del self.__contacts_by_zip_code[contact.zip_code]
+
+    def __last_ring(self, centre_cell):
+        """
+        :return: the ring of cells around the centre cell beyond which there are no zip codes, int
+        """
+        row, column = centre_cell
+        return max(row - self.__first_row, self.__last_row - row,
+                   column - self.__first_column, self.__last_column - column, 0)
+
+    def __zip_codes_in_ring(self, centre_cell, ring):
+        """
+        Collects the zip codes on the border of the square of cells around the centre
+        cell, so every cell is visited once however many rings are searched.
+        :return: the zip codes in the cells at a distance of exactly ring cells from the centre cell
+        """
+        row, column = centre_cell
+        cells = self.__cells
+        zip_codes = []
+
+        first_column = max(column - ring, self.__first_column)
+        last_column = min(column + ring, self.__last_column)
+
+        # The top and the bottom rows of the ring.
+        for cell_row in {row - ring, row + ring}:
+            if self.__first_row <= cell_row <= self.__last_row:
+                for cell_column in range(first_column, last_column + 1):
+                    zip_codes.extend(cells.get((cell_row, cell_column), ()))
+
+        # The left and the right columns of the ring, without the corners.
+        if ring > 0:
+            for cell_column in (column - ring, column + ring):
+                if self.__first_column <= cell_column <= self.__last_column:
+                    for cell_row in range(max(row - ring + 1, self.__first_row),
+                                          min(row + ring - 1, self.__last_row) + 1):
+                        zip_codes.extend(cells.get((cell_row, cell_column), ()))
+
+        return zip_codes
+
+    def within(self, zip_code, radius_km):
+        """
+        Finds the contacts within a distance of a zip code.
+        :param zip_code: zip code of the centre, str
+        :param radius_km: distance in kilometres, float
+        :return: list of (distance in km, address book key) tuples, nearest first
+        :raises KeyError: if there are no coordinates for the zip code
+        """
+        centre = self.coordinates[zip_code]
+        centre_cell = self.__cell_of(centre)
+        rings = min(math.ceil(radius_km / self.cell_size_km) + 1, self.__last_ring(centre_cell))
+
+        results = []
+        for ring in range(rings + 1):
+            for other_zip_code in self.__zip_codes_in_ring(centre_cell, ring):
+                keys = self.__contacts_by_zip_code.get(other_zip_code)
+                if keys:
+                    distance = distance_km(centre, self.coordinates[other_zip_code])
+                    if distance <= radius_km:
+                        results.extend((distance, key) for key in keys)
+
+        results.sort()
+        return results
+
+    def nearest(self, zip_code, count):
+        """
+        Finds the contacts nearest to a zip code. The rings of cells around the zip
+        code are searched outwards until no closer contacts can be left in the next ring,
+        or until every contact has been found.
+        :param zip_code: zip code of the centre, str
+        :param count: number of contacts, int
+        :return: list of (distance in km, address book key) tuples, nearest first
+        :raises KeyError: if there are no coordinates for the zip code
+        """
+        centre = self.coordinates[zip_code]
+        centre_cell = self.__cell_of(centre)
+
+        # The nearest contacts found so far, and the number of contacts seen.
+        results = []
+        number_found = 0
+
+        for ring in range(self.__last_ring(centre_cell) + 1):
+            ring_results = []
+            for other_zip_code in self.__zip_codes_in_ring(centre_cell, ring):
+                keys = self.__contacts_by_zip_code.get(other_zip_code)
+                if keys:
+                    distance = distance_km(centre, self.coordinates[other_zip_code])
+                    ring_results.extend((distance, key) for key in keys)
+
+            # Only the new ring is sorted and merged into the nearest contacts so far.
+            number_found += len(ring_results)
+            ring_results.sort()
+            results = list(itertools.islice(heapq.merge(results, ring_results), count))
+
+            # Every point in the next ring is at least ring cells away from the centre.
+            if number_found == self.__number_of_contacts:
+                break
+            if len(results) == count and results[-1][0] <= ring * self.cell_size_km:
+                break
+
+        return results
+
+
+# **************************
+# *  Encrypted storage     *
+# **************************
+
+class EncryptionKey:
+    """
+    This class holds the key of the encrypted address book, read from a keyfile
+    or derived from a passphrase. A passphrase is stretched with scrypt and the salt
+    stored in the file, so the same passphrase gives a different key for every salt.
+    """
+
+    def __init__(self, keyfile=None, passphrase=None):
+        """
+        Give either a keyfile or a passphrase.
+        :param keyfile: name of a file with 32 random bytes, str
+        :param passphrase: passphrase, str
+        :raises ValueError: if the keyfile does not contain a 32 byte key
+        :raises RuntimeError: if the cryptography package is not installed
+        """
+        if AESGCM is None:
+            raise RuntimeError("encrypted storage needs the cryptography package")
+
+        self.__key = None
+        self.__passphrase = passphrase
+
+        if keyfile is not None:
+            with open(keyfile, mode="rb") as file:
+                self.__key = file.read()
+            if len(self.__key) != ENCRYPTION_KEY_SIZE:
+                raise ValueError(f"keyfile must contain exactly {ENCRYPTION_KEY_SIZE} bytes")
+
+        # The salt of the file which was loaded is used again when saving,
+        # so the slow scrypt is run only once per passphrase.
+        self.salt = os.urandom(ENCRYPTION_SALT_SIZE)
+        self.__ciphers = {}
+
+    def cipher(self, salt):
+        """
+        :param salt: salt of the encrypted file, bytes
+        :return: AESGCM cipher with the key for the salt
+        """
+        if salt not in self.__ciphers:
+            if self.__key is not None:
+                key = self.__key
+            else:
+                key = hashlib.scrypt(self.__passphrase.encode("utf-8"), salt=salt,
+                                     n=2 ** 14, r=8, p=1, dklen=ENCRYPTION_KEY_SIZE)
+            self.__ciphers[salt] = AESGCM(key)
+
+        return self.__ciphers[salt]
+
+
+def create_keyfile(filename):
+    """
+    Creates a keyfile with a random key, readable only by its owner.
+    :param filename: name of the keyfile, str
+    :raises FileExistsError: if the file already exists
+    """
+    descriptor = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, mode="wb") as file:
+        file.write(os.urandom(ENCRYPTION_KEY_SIZE))
+
+
+def _chunk_associated_data(header, chunk_number, final):
+    """
+    The header, the number of the chunk and the final flag are authenticated with
+    every chunk, so chunks cannot be reordered, moved between files or cut off.
+    """
+    return header + struct.pack(">Q?", chunk_number, final)
+
+
+class EncryptedWriter:
+    """
+    This class writes text into an encrypted file chunk by chunk, so memory use does
+    not grow with the size of the file. The file is replaced only when the writer is
+    closed, so a failed save leaves the previous file as it was.
+    """
+
+    def __init__(self, filename, encryption_key):
+        """
+        :param filename: name of the encrypted file, str
+        :param encryption_key: EncryptionKey object
+        """
+        self.filename = filename
+        self.__temporary_filename = f"{filename}.saving"
+        self.__file = open(self.__temporary_filename, mode="wb")
+
+        self.__header = ENCRYPTION_MAGIC + encryption_key.salt
+        self.__cipher = encryption_key.cipher(encryption_key.salt)
+        self.__buffer = bytearray()
+        self.__chunk_number = 0
+
+        self.__file.write(self.__header)
+
+    def write(self, text):
+        """
+        :param text: text to write, str
+        """
+        self.__buffer += text.encode("utf-8")
+
+        while len(self.__buffer) >= ENCRYPTION_CHUNK_SIZE:
+            self.__write_chunk(bytes(self.__buffer[:ENCRYPTION_CHUNK_SIZE]), False)
+            del self.__buffer[:ENCRYPTION_CHUNK_SIZE]
+
+    def __write_chunk(self, data, final):
+        nonce = os.urandom(ENCRYPTION_NONCE_SIZE)
+        encrypted_data = self.__cipher.encrypt(
+            nonce, data, _chunk_associated_data(self.__header, self.__chunk_number, final))
+
+        self.__file.write(ENCRYPTION_CHUNK_HEADER.pack(final, len(encrypted_data)))
+        self.__file.write(nonce)
+        self.__file.write(encrypted_data)
+        self.__chunk_number += 1
+
+    def close(self):
+        """
+        Writes the final chunk and replaces the encrypted file with the new one.
+        """
+        self.__write_chunk(bytes(self.__buffer), True)
+        self.__buffer = bytearray()
+        self.__file.close()
+        os.replace(self.__temporary_filename, self.filename)
+
+
+def read_encrypted_rows(filename, encryption_key):
+    """
+    Reads the rows of an encrypted file chunk by chunk.
+    :param filename: name of the encrypted file, str
+    :param encryption_key: EncryptionKey object
+    :return: generator of rows, str
+    :raises ValueError: if the key is wrong or the file has been damaged or cut off
+    """
+    with open(filename, mode="rb") as file:
+        header = file.read(len(ENCRYPTION_MAGIC) + ENCRYPTION_SALT_SIZE)
+        if not header.startswith(ENCRYPTION_MAGIC) or len(header) != len(ENCRYPTION_MAGIC) + ENCRYPTION_SALT_SIZE:
+            raise ValueError(f"{filename} is not an encrypted address book")
+
+        # Saving again uses the same salt, so the key is not derived again.
+        salt = header[len(ENCRYPTION_MAGIC):]
+        encryption_key.salt = salt
+        cipher = encryption_key.cipher(salt)
+
+        # Bytes of a row which continues in the next chunk.
+        remainder = b""
+        chunk_number = 0
+        final = False
+
+        while not final:
+            chunk_header = file.read(ENCRYPTION_CHUNK_HEADER.size)
+            if len(chunk_header) != ENCRYPTION_CHUNK_HEADER.size:
+                raise ValueError(f"{filename} has been cut off")
+
+            final, length = ENCRYPTION_CHUNK_HEADER.unpack(chunk_header)
+            nonce = file.read(ENCRYPTION_NONCE_SIZE)
+            encrypted_data = file.read(length)
+            if len(encrypted_data) != length:
+                raise ValueError(f"{filename} has been cut off")
+
+            try:
+                data = cipher.decrypt(nonce, encrypted_data, _chunk_associated_data(header, chunk_number, final))
+            except InvalidTag:
+                raise ValueError(f"wrong key, or {filename} has been damaged") from None
+
+            chunk_number += 1
+
+            rows = (remainder + data).split(b"\n")
+            remainder = rows.pop()
+            for row in rows:
+                yield row.decode("utf-8") + "\n"
+
+        if remainder:
+            yield remainder.decode("utf-8")
+
+
+def benchmark_encryption(number_of_contacts, rounds=3):
+    """
+    Measures how much slower saving and loading the address book is when it is
+    encrypted, using synthetic contacts in a temporary directory.
+    :param number_of_contacts: number of contacts in the address book, int
+    :param rounds: the fastest of this many rounds is reported, int
+    :return: dict of (storage, operation) -> seconds
+    """
+    contacts = [ContactCard(f"First{i}", f"Last{i}", f"Benchmarkinkatu {i % 100} A {i % 30}",
+                            "33720", "Tampere")
+                for i in range(number_of_contacts)]
+
+    temporary_directory = tempfile.mkdtemp()
+    plain_filename = os.path.join(temporary_directory, ADDRESS_BOOK_FILENAME)
+    encrypted_filename = os.path.join(temporary_directory, ENCRYPTED_ADDRESS_BOOK_FILENAME)
+    keyfile = os.path.join(temporary_directory, "benchmark.key")
+    create_keyfile(keyfile)
+    encryption_key = EncryptionKey(keyfile=keyfile)
+
+    def save_plain():
+        with open(plain_filename, mode="w", encoding="utf-8") as file:
+            for contact in contacts:
+                file.write(contact_to_row(contact))
+
+    def load_plain():
+        with open(plain_filename, mode="r", encoding="utf-8") as file:
+            for row in file:
+                row_to_contact(row)
+
+    def save_encrypted():
+        file = EncryptedWriter(encrypted_filename, encryption_key)
+        for contact in contacts:
+            file.write(contact_to_row(contact))
+        file.close()
+
+    def load_encrypted():
+        for row in read_encrypted_rows(encrypted_filename, encryption_key):
+            row_to_contact(row)
+
+    timings = {}
+    try:
+        for name, operation, function in (("plain", "save", save_plain), ("plain", "load", load_plain),
+                                          ("encrypted", "save", save_encrypted),
+                                          ("encrypted", "load", load_encrypted)):
+            fastest = None
+            for _ in range(rounds):
+                start_time = time.perf_counter()
+                function()
+                elapsed_time = time.perf_counter() - start_time
+                fastest = elapsed_time if fastest is None else min(fastest, elapsed_time)
+            timings[(name, operation)] = fastest
+    finally:
+        shutil.rmtree(temporary_directory)
+
+    return timings
+
+
+# **************************
+# *  Mutation events       *
+# **************************
+
+def _row_start(file, position):
+    """
+    Finds the start of the first row of a binary file at or after a byte offset.
+    :param file: file opened in binary mode
+    :param position: byte offset, int
+    :return: byte offset of the start of the row, int
+    """
+    if position == 0:
+        return 0
+
+    # Reading from the previous byte to the end of its row stops right at
+    # the position if the previous byte is the newline of the previous row.
+    file.seek(position - 1)
+    file.readline()
+    return file.tell()
+
+
+def _find_event_offset(file, sequence_number):
+    """
+    Finds the byte offset of the first event after a sequence number in an event log.
+    The sequence numbers of the log grow, so the offset is found with a binary
+    search over the file instead of reading the whole log.
+    :param file: event log opened in binary mode
+    :param sequence_number: sequence number of the last event already seen, int
+    :return: byte offset of the first row to read, int
+    """
+    low = 0
+    high = file.seek(0, os.SEEK_END)
+
+    while low < high:
+        middle = (low + high) // 2
+
+        file.seek(_row_start(file, middle))
+        row = file.readline()
+
+        # A row still being written counts as a later event.
+        if not row.endswith(b"\n") or json.loads(row)["sequence"] > sequence_number:
+            high = middle
+        else:
+            low = middle + 1
+
+    return _row_start(file, low)
+
+
+def read_events(filename=EVENT_LOG_FILENAME, after_sequence=0):
+    """
+    Reads the events of an event log which come after a sequence number.
+    :param filename: name of the event log, str
+    :param after_sequence: sequence number of the last event already seen, int
+    :return: generator of events, dict
+    """
+    try:
+        file = open(filename, mode="rb")
+    except FileNotFoundError:
+        return
+
+    with file:
+        file.seek(_find_event_offset(file, after_sequence))
+
+        for row in file:
+            # A row still being written is left for the next read.
+            if not row.endswith(b"\n"):
+                break
+
+            yield json.loads(row)
+
+
+def tail_event_log(filename=EVENT_LOG_FILENAME, after_sequence=0, poll_interval=0.5):
+    """
+    Follows an event log like "tail -f", starting after a sequence number.
+    :param filename: name of the event log, str
+    :param after_sequence: sequence number of the last event already seen, int
+    :param poll_interval: seconds to wait for new events, float
+    :return: generator of events, dict, which never ends
+    """
+    while True:
+        for event in read_events(filename, after_sequence):
+            after_sequence = event["sequence"]
+            yield event
+
+        time.sleep(poll_interval)
+
+
+def tail_event_socket(port, after_sequence=0, host="127.0.0.1"):
+    """
+    Follows the events published by an EventServer, starting after a sequence number.
+    :param port: port of the event server, int
+    :param after_sequence: sequence number of the last event already seen, int
+    :param host: address of the event server, str
+    :return: generator of events, dict, which ends when the server closes
+    """
+    with socket.create_connection((host, port)) as connection:
+        connection.sendall(f"{after_sequence}\n".encode("utf-8"))
+
+        for row in connection.makefile(mode="rb"):
+            yield json.loads(row)
+
+
+class MutationEventStream:
+    """
+    This class publishes the changes made to the address book as events. Each event
+    has a sequence number which grows by one for every event, and the contact as it
+    was before and after the change. Events are appended to an event log, from which
+    subscribers can resume after the last sequence number they have seen.
+    """
+
+    def __init__(self, filename=EVENT_LOG_FILENAME, batch_size=EVENT_BATCH_SIZE):
+        """
+        The sequence numbers continue from the last event of an existing event log.
+        :param filename: name of the event log, or None to keep no event log, str
+        :param batch_size: number of events delivered at a time, int
+        """
+        self.filename = filename
+        self.batch_size = batch_size
+        self.sequence_number = self.__last_sequence_number()
+
+        self.__batch = []
+        self.__subscribers = []
+
+        # Subscribers may be added from the threads of the event server.
+        self.__lock = threading.Lock()
+
+    def __last_sequence_number(self):
+        """
+        :return: sequence number of the last event in the event log, 0 if there is none
+        """
+        if self.filename is None:
+            return 0
+
+        try:
+            file = open(self.filename, mode="rb")
+        except FileNotFoundError:
+            return 0
+
+        with file:
+            # Only the end of the file is read, enough to contain the last event.
+            size = file.seek(0, os.SEEK_END)
+            file.seek(max(0, size - 64 * 1024))
+            rows = file.read().splitlines()
+
+        for row in reversed(rows):
+            try:
+                return json.loads(row)["sequence"]
+            except (ValueError, KeyError):
+                continue
+
+        return 0
+
+    def publish(self, kind, key, old_contact, new_contact):
+        """
+        Publishes an event of a change to the address book.
+        :param kind: EVENT_ADD, EVENT_EDIT or EVENT_DELETE, str
+        :param key: address book key of the contact, str
+        :param old_contact: ContactCard object before the change, None for EVENT_ADD
+        :param new_contact: ContactCard object after the change, None for EVENT_DELETE
+        :return: True if the batch was delivered, False if the event is waiting for flush
+        """
+        with self.__lock:
+            self.sequence_number += 1
+            self.__batch.append({"sequence": self.sequence_number,
+                                 "time": time.time(),
+                                 "kind": kind,
+                                 "key": key,
+                                 "old": vars(old_contact).copy() if old_contact is not None else None,
+                                 "new": vars(new_contact).copy() if new_contact is not None else None})
+
+            if len(self.__batch) < self.batch_size:
+                return False
+
+        self.flush()
+        return True
+
+    def flush(self):
+        """
+        Appends the waiting events to the event log and delivers them to the subscribers.
+        """
+        with self.__lock:
+            batch = self.__batch
+            self.__batch = []
+            subscribers = list(self.__subscribers)
+
+            if batch and self.filename is not None:
+                with open(self.filename, mode="a", encoding="utf-8") as file:
+                    file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in batch))
+
+        if batch:
+            for subscriber in subscribers:
+                subscriber(batch)
+
+    def subscribe(self, subscriber, after_sequence=None):
+        """
+        Subscribes to the events. Events are delivered as lists of events.
+        :param subscriber: function which is called with each batch of events
+        :param after_sequence: if given, the events in the event log after this sequence
+                               number are delivered first, int
+        """
+        # Most of the event log is delivered without holding the lock, so that
+        # a subscriber resuming from far behind does not block the publishers.
+        if after_sequence is not None:
+            after_sequence = self.__deliver_from_log(subscriber, after_sequence)
+
+        with self.__lock:
+            # The log has every event up to the waiting batch, and the lock keeps
+            # new events from being flushed before the subscriber is added.
+            if after_sequence is not None:
+                self.__deliver_from_log(subscriber, after_sequence)
+
+            self.__subscribers.append(subscriber)
+
+    def __deliver_from_log(self, subscriber, after_sequence):
+        """
+        Delivers the events of the event log after a sequence number in batches.
+        :return: sequence number of the last delivered event, int
+        """
+        if self.filename is None:
+            return after_sequence
+
+        batch = []
+        for event in read_events(self.filename, after_sequence):
+            batch.append(event)
+            after_sequence = event["sequence"]
+
+            if len(batch) == self.batch_size:
+                subscriber(batch)
+                batch = []
+
+        if batch:
+            subscriber(batch)
+
+        return after_sequence
+
+    def unsubscribe(self, subscriber):
+        """
+        Stops delivering events to a subscriber.
+        :param subscriber: function given to subscribe
+        """
+        with self.__lock:
+            if subscriber in self.__subscribers:
+                self.__subscribers.remove(subscriber)
+
+
+class EventServer(socketserver.ThreadingTCPServer):
+    """
+    This class serves the events of a MutationEventStream on a local socket.
+    A client sends the sequence number of the last event it has seen followed by
+    a newline, and receives every later event as a row of JSON.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, event_stream, port, host="127.0.0.1"):
+        """
+        :param event_stream: MutationEventStream object
+        :param port: port to listen to, 0 picks a free port, int
+        :param host: address to listen to, only the local machine by default, str
+        """
+        self.event_stream = event_stream
+        super().__init__((host, port), EventRequestHandler)
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class EventRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Sends the events of the EventServer to one client.
+    """
+
+    def handle(self):
+        try:
+            after_sequence = int(self.rfile.readline())
+        except ValueError:
+            return
+
+        # The event stream calls the subscriber in the thread which flushes,
+        # so the batches are passed to this thread through a queue.
+        batches = queue.Queue()
+        self.server.event_stream.subscribe(batches.put, after_sequence)
+
+        try:
+            while True:
+                batch = batches.get()
+                self.wfile.write("".join(json.dumps(event, ensure_ascii=False) + "\n"
+                                         for event in batch).encode("utf-8"))
+        except OSError:
+            pass
+        finally:
+            self.server.event_stream.unsubscribe(batches.put)
+
+
+# **************************
+# *  Address book rows     *
+# **************************
+
+def contact_to_row(contact):
+    """
+    Formats a contact card into the row stored in the address book file.
+    :param contact: ContactCard object
+    :return: semicolon separated row ending in a newline, str
+    """
+    return f"{contact.first_name};{contact.last_name};" \
+           f"{contact.address};{contact.zip_code};{contact.city}\n"
+
+
+def row_to_contact(row):
+    """
+    Parses a row of the address book file into a contact card.
+    A byte order mark left at the start of the file is ignored.
+    :param row: row of the address book file, str
+    :return: ContactCard object
+    :raises ValueError: if the row does not have exactly five fields
+    """
+    address_variables = row.lstrip("\ufeff").rstrip("\r\n").split(";")
+
+    if len(address_variables) != ADDRESS_BOOK_FIELD_COUNT:
+        raise ValueError(f"expected {ADDRESS_BOOK_FIELD_COUNT} fields, got {len(address_variables)}")
+
+    firstname, lastname, address, zipcode, city = address_variables
+    return ContactCard(firstname, lastname, address, zipcode, city)
+
+
+def contact_key(first_name, last_name):
+    """
+    Constructs the address book key of a person. lower() is used for key
+    consistency and user-friendly search.
+    :return: "lastname,firstname" in lower case, str
+    """
+    return f"{last_name},{first_name}".lower()
+
+
+def read_zip_code_table(filename=ZIPCODES_FILENAME):
+    """
+    Reads the zip code file into a dictionary of zip code -> city.
+    The file is read as "utf-8-sig" so that the byte order mark at the top
+    of the file does not end up glued to the first zip code.
+    :param filename: name of the zip code file, str
+    :return: dict of zip codes and cities
+    :raises ValueError: if a row is not in the "zipcode;city" format
+    :raises OSError: if the file cannot be read
+    """
+    zip_codes_and_cities = {}
+
+    with open(filename, mode="r", encoding="utf-8-sig") as file:
+        for row in file:
+            zip_code, city = row.rstrip().split(";")
+            zip_codes_and_cities[zip_code] = city
+
+    return zip_codes_and_cities
+
+
+# ***************************
+# *  Sharded address book   *
+# ***************************
+
+def _load_shard(filename):
+    """
+    Reads a shard file in a worker process. The rows are split into fields
+    here, so the main process only needs to create the contact cards.
+    :param filename: name of the shard file, str
+    :return: fields of the contacts and the malformed rows, (list of tuples, list of str)
+    """
+    contacts = []
+    malformed_rows = []
+
+    with open(filename, mode="r", encoding="utf-8") as file:
+        for row in file:
+            fields = row.lstrip("\ufeff").rstrip("\r\n").split(";")
+            if len(fields) == ADDRESS_BOOK_FIELD_COUNT:
+                contacts.append(tuple(fields))
+            else:
+                malformed_rows.append(row if row.endswith("\n") else row + "\n")
+
+    return contacts, malformed_rows
+
+
+def _save_shard(filename, contacts, malformed_rows):
+    """
+    Writes a shard file in a worker process. The file is replaced only after
+    the new contents have been written.
+    :param filename: name of the shard file, str
+    :param contacts: fields of the contacts, list of tuples
+    :param malformed_rows: rows which could not be loaded, list of str
+    """
+    temporary_filename = f"{filename}.saving"
+
+    with open(temporary_filename, mode="w", encoding="utf-8") as file:
+        file.write("".join(";".join(fields) + "\n" for fields in contacts))
+        file.write("".join(malformed_rows))
+
+    os.replace(temporary_filename, filename)
+
+
+class ShardedAddressBook(MutableMapping):
+    """
+    This class is an address book dictionary divided into shards, each of which
+    is saved to its own file. The shards are loaded and saved in parallel by a
+    process pool, and only the shards which have changed are saved. Iterating
+    the address book merges the sorted keys of the shards.
+    """
+
+    def __init__(self, number_of_shards, partition=PARTITION_BY_SURNAME, directory=SHARD_DIRECTORY):
+        """
+        :param number_of_shards: number of shards, int
+        :param partition: PARTITION_BY_SURNAME to divide the contacts by a hash of their
+                          surname, PARTITION_BY_ZIP_REGION by the region of their zip code, str
+        :param directory: directory of the shard files, str
+        """
+        self.number_of_shards = number_of_shards
+        self.partition = partition
+        self.directory = directory
+
+        self.__shards = [{} for _ in range(number_of_shards)]
+        self.__malformed_rows = [[] for _ in range(number_of_shards)]
+        self.__dirty_shards = set()
+
+        # The shard of every key. A contact's shard cannot be computed from its key
+        # alone when the shards are divided by zip code region.
+        self.__shard_of_key = {}
+
+        # Files of shards beyond the number of shards, removed on the next save.
+        self.__extra_shard_filenames = []
+
+        self.__pool = None
+
+    def shard_filename(self, shard):
+        """
+        :param shard: number of the shard, int
+        :return: name of the file of the shard, str
+        """
+        return os.path.join(self.directory, f"shard_{shard:03d}.txt")
+
+    def shard_of(self, contact):
+        """
+        :param contact: ContactCard object
+        :return: number of the shard the contact belongs to, int
+        """
+        if self.partition == PARTITION_BY_ZIP_REGION:
+            name = contact.zip_code[:ZIP_REGION_PREFIX_LENGTH]
+        else:
+            name = contact.last_name.lower()
+
+        # zlib.crc32 gives the same shard on every run, unlike hash().
+        return zlib.crc32(name.encode("utf-8")) % self.number_of_shards
+
+    def pool(self):
+        """
+        :return: the process pool of the address book, created when first needed
+        """
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(max_workers=min(self.number_of_shards, os.cpu_count() or 1))
+        return self.__pool
+
+    def close(self):
+        """
+        Shuts down the process pool.
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+    # -- Dictionary methods --
+
+    def __getitem__(self, key):
+        return self.__shards[self.__shard_of_key[key]][key]
+
+    def __setitem__(self, key, contact):
+        shard = self.shard_of(contact)
+
+        # An edited contact may move to another shard.
+        old_shard = self.__shard_of_key.get(key)
+        if old_shard is not None and old_shard != shard:
+            del self.__shards[old_shard][key]
+            self.__dirty_shards.add(old_shard)
+
+        self.__shards[shard][key] = contact
+        self.__shard_of_key[key] = shard
+        self.__dirty_shards.add(shard)
+
+    def __delitem__(self, key):
+        shard = self.__shard_of_key.pop(key)
+        del self.__shards[shard][key]
+        self.__dirty_shards.add(shard)
+
+    def __contains__(self, key):
+        return key in self.__shard_of_key
+
+    def __len__(self):
+        return len(self.__shard_of_key)
+
+    def __iter__(self):
+        # Each shard is sorted on its own and the sorted shards are merged.
+        return heapq.merge(*(sorted(shard) for shard in self.__shards))
+
+    def values(self):
+        # The values are not needed in order, so the shards are simply chained.
+        return itertools.chain.from_iterable(shard.values() for shard in self.__shards)
+
+    def items(self):
+        return itertools.chain.from_iterable(shard.items() for shard in self.__shards)
+
+    # -- Loading and saving --
+
+    def load(self, filename=ADDRESS_BOOK_FILENAME):
+        """
+        Loads the shard files in parallel. If there are no shard files yet, the
+        contacts are imported from the unsharded address book file, which is renamed
+        once the shards have been saved. Contacts in the wrong shard, for example after the
+        number of shards was changed, are moved to the right one.
+        :param filename: name of the unsharded address book file, str
+        :return: number of malformed rows, int
+        """
+        shard_filenames = sorted(glob.glob(os.path.join(self.directory, "shard_*.txt")))
+
+        # The number of a shard is in the name of its file.
+        file_shards = [int(os.path.basename(name)[len("shard_"):-len(".txt")]) for name in shard_filenames]
+
+        importing = not shard_filenames
+        if importing:
+            shard_filenames = [filename] if os.path.exists(filename) else []
+            file_shards = [0] * len(shard_filenames)
+            self.__dirty_shards.update(range(self.number_of_shards))
+
+        loaded_shards = self.pool().map(_load_shard, shard_filenames)
+
+        for file_shard, (contacts, malformed_rows) in zip(file_shards, loaded_shards):
+            for fields in contacts:
+                contact = ContactCard(*fields)
+                key = contact_key(contact.first_name, contact.last_name)
+
+                # The first row of a contact is kept, like in the unsharded address book.
+                if key in self.__shard_of_key:
+                    continue
+
+                shard = self.shard_of(contact)
+                self.__shards[shard][key] = contact
+                self.__shard_of_key[key] = shard
+
+                if shard != file_shard:
+                    self.__dirty_shards.add(shard)
+                    self.__dirty_shards.add(min(file_shard, self.number_of_shards - 1))
+
+            # Malformed rows stay in the file they were found in, or in the last
+            # shard if the file is beyond the number of shards.
+            self.__malformed_rows[min(file_shard, self.number_of_shards - 1)].extend(malformed_rows)
+
+        if not importing:
+            self.__extra_shard_filenames = [name for name, shard in zip(shard_filenames, file_shards)
+                                            if shard >= self.number_of_shards]
+            if self.__extra_shard_filenames:
+                self.__dirty_shards.add(self.number_of_shards - 1)
+
+        # An imported address book is saved into shards right away, and the unsharded
+        # file is renamed so that nothing reads or overwrites its stale contacts later.
+        elif shard_filenames:
+            self.save()
+            os.replace(filename, filename + IMPORTED_SUFFIX)
+
+        return sum(len(rows) for rows in self.__malformed_rows)
+
+    def save(self):
+        """
+        Saves the shards which have changed since the last save, in parallel.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        dirty_shards = sorted(self.__dirty_shards)
+        self.__dirty_shards = set()
+
+        filenames = [self.shard_filename(shard) for shard in dirty_shards]
+        contacts = [[(contact.first_name, contact.last_name, contact.address, contact.zip_code, contact.city)
+                     for contact in self.__shards[shard].values()]
+                    for shard in dirty_shards]
+        malformed_rows = [self.__malformed_rows[shard] for shard in dirty_shards]
+
+        # A single shard, the usual case after one change, is written right here
+        # instead of being sent to a worker process.
+        if len(dirty_shards) == 1:
+            _save_shard(filenames[0], contacts[0], malformed_rows[0])
+
+        # list() waits for every shard to be written and raises the errors of the workers.
+        elif dirty_shards:
+            list(self.pool().map(_save_shard, filenames, contacts, malformed_rows))
+
+        for filename in self.__extra_shard_filenames:
+            os.remove(filename)
+        self.__extra_shard_filenames = []
+
+
+# ***************************
+# *  Address book checking  *
+# ***************************
+
+# Kinds of problems the address book check reports.
+PROBLEM_MALFORMED = "malformed row"
+PROBLEM_BYTE_ORDER_MARK = "byte order mark"
+PROBLEM_UNKNOWN_ZIP = "unknown zip code"
+PROBLEM_CITY_MISMATCH = "city mismatch"
+
+# The zip code table of a checking worker process. It is sent once per
+# process by the pool initializer instead of once per chunk.
+_worker_zip_codes = {}
+
+
+def _init_check_worker(zip_codes_and_cities):
+    """
+    Process pool initializer for the address book check.
+    :param zip_codes_and_cities: dict of zip codes and cities
+    """
+    global _worker_zip_codes
+    _worker_zip_codes = zip_codes_and_cities
+
+
+def check_address_book_rows(rows, first_line_number, zip_codes_and_cities=None):
+    """
+    Checks a chunk of address book rows against the zip code table.
+    :param rows: list of rows, str
+    :param first_line_number: line number of the first row in the file, int
+    :param zip_codes_and_cities: dict of zip codes and cities, defaults to
+                                 the table of the worker process
+    :return: list of problems as (line number, problem, description, repaired row)
+             tuples. The repaired row is None if the row cannot be repaired.
+    """
+    if zip_codes_and_cities is None:
+        zip_codes_and_cities = _worker_zip_codes
+
+    problems = []
+
+    for line_number, row in enumerate(rows, start=first_line_number):
+        try:
+            contact = row_to_contact(row)
+        except ValueError as error:
+            problems.append((line_number, PROBLEM_MALFORMED, str(error), None))
+            continue
+
+        if row.startswith("\ufeff"):
+            problems.append((line_number, PROBLEM_BYTE_ORDER_MARK,
+                             "row starts with a byte order mark", contact_to_row(contact)))
+
+        if contact.zip_code not in zip_codes_and_cities:
+            problems.append((line_number, PROBLEM_UNKNOWN_ZIP,
+                             f"zip code {contact.zip_code!r} is not in the zip code table", None))
+            continue
+
+        city = zip_codes_and_cities[contact.zip_code]
+        if contact.city != city:
+            description = f"city {contact.city!r} should be {city!r}"
+            contact.city = city
+            problems.append((line_number, PROBLEM_CITY_MISMATCH, description, contact_to_row(contact)))
+
+    return problems
+
+
+def read_address_book_rows(filename, encryption_key=None):
+    """
+    Reads the rows of an address book file, decrypting them if the file is encrypted.
+    :param filename: name of the address book file, str
+    :param encryption_key: EncryptionKey object of an encrypted file, or None
+    :return: generator of rows, str
+    """
+    if encryption_key is not None:
+        yield from read_encrypted_rows(filename, encryption_key)
+    else:
+        with open(filename, mode="r", encoding="utf-8") as file:
+            yield from file
+
+
+def check_address_book(zip_codes_and_cities, filename=ADDRESS_BOOK_FILENAME,
+                       chunk_size=50000, workers=None, encryption_key=None):
+    """
+    Checks the whole address book file against the zip code table. The file is
+    streamed in chunks which are checked in parallel by a process pool, so
+    memory use does not grow with the size of the address book.
+    :param zip_codes_and_cities: dict of zip codes and cities
+    :param filename: name of the address book file, str
+    :param chunk_size: number of rows sent to a worker at a time, int
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param encryption_key: EncryptionKey object if the file is encrypted, or None
+    :return: list of problems sorted by line number, see check_address_book_rows
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    problems = []
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_check_worker,
+                             initargs=(zip_codes_and_cities,)) as pool:
+
+        # Only a couple of chunks per worker are kept in flight at a time.
+        pending = []
+
+        line_number = 1
+        rows = []
+
+        for row in read_address_book_rows(filename, encryption_key):
+            rows.append(row)
+
+            if len(rows) == chunk_size:
+                pending.append(pool.submit(check_address_book_rows, rows, line_number))
+                line_number += len(rows)
+                rows = []
+
+                if len(pending) >= 2 * workers:
+                    problems.extend(pending.pop(0).result())
+
+        if rows:
+            pending.append(pool.submit(check_address_book_rows, rows, line_number))
+
+        for future in pending:
+            problems.extend(future.result())
+
+    problems.sort(key=lambda problem: problem[0])
+    return problems
+
+
+def repair_address_book(problems, filename=ADDRESS_BOOK_FILENAME, encryption_key=None):
+    """
+    Rewrites the address book file with the repairs found by check_address_book.
+    Rows which cannot be repaired are moved to "<filename>.rejected" so that
+    no data is lost. The file is replaced only after the repair has been written.
+    The rejected rows of an encrypted address book are encrypted as well.
+    :param problems: list of problems returned by check_address_book
+    :param filename: name of the address book file, str
+    :param encryption_key: EncryptionKey object if the file is encrypted, or None
+    :return: number of repaired rows and number of rejected rows, (int, int)
+    """
+
+    # A row can have several problems, the last repair contains all fixes for the row.
+    repairs = {}
+    for line_number, problem, description, repaired_row in problems:
+        if repaired_row is None or repairs.get(line_number, "") is None:
+            repairs[line_number] = None
+        else:
+            repairs[line_number] = repaired_row
+
+    temporary_filename = f"{filename}.repair"
+    rejected_filename = f"{filename}.rejected"
+    repaired = 0
+    rejected = 0
+
+    # An encrypted file is written to a temporary file and replaced by the writer itself.
+    if encryption_key is not None:
+        repaired_file = EncryptedWriter(filename, encryption_key)
+        rejected_file = EncryptedWriter(rejected_filename, encryption_key)
+
+        # An encrypted file cannot be appended to, so the rows rejected
+        # by an earlier repair are written again first.
+        if os.path.exists(rejected_filename):
+            for row in read_encrypted_rows(rejected_filename, encryption_key):
+                rejected_file.write(row)
+    else:
+        repaired_file = open(temporary_filename, mode="w", encoding="utf-8")
+        rejected_file = open(rejected_filename, mode="a", encoding="utf-8")
+
+    for line_number, row in enumerate(read_address_book_rows(filename, encryption_key), start=1):
+        if line_number not in repairs:
+            repaired_file.write(row)
+        elif repairs[line_number] is None:
+            rejected_file.write(row if row.endswith("\n") else row + "\n")
+            rejected += 1
+        else:
+            repaired_file.write(repairs[line_number])
+            repaired += 1
+
+    repaired_file.close()
+    rejected_file.close()
+
+    if encryption_key is None:
+        os.replace(temporary_filename, filename)
+    return repaired, rejected
+
+
+def print_address_book_report(problems):
+    """
+    Prints the problems found by check_address_book, one per line.
+    :param problems: list of problems returned by check_address_book
+    """
+    for line_number, problem, description, repaired_row in problems:
+        repairable = "repairable" if repaired_row is not None else "not repairable"
+        print(f"line {line_number}: {problem}: {description} ({repairable})")
+
+    print(f"{len(problems)} problem(s) found.")
+
+
 class GUI:
     """
     This class is the implementation of a simple user interface.
     The GUI
     """
 
-    def __init__(self):
+    def __init__(self, lazy_load=False, event_port=None, shards=None, partition=PARTITION_BY_SURNAME,
+                 encryption_key=None):
         """
         Here we define a lot of elements of the GUI.
         This is full of elements which will be further explained and configured in class methods.
+        :param lazy_load: if True, the window is shown after the first rows of the address
+                          book have been loaded and the rest are loaded in the background, bool
+        :param event_port: if given, the changes to the address book are served on this
+                           local port, int
+        :param shards: if given, the address book is divided into this many shard files
+                       which are loaded and saved in parallel, int
+        :param partition: how a sharded address book is divided, PARTITION_BY_SURNAME or
+                          PARTITION_BY_ZIP_REGION, str
+        :param encryption_key: if given, the address book is stored encrypted with this
+                               EncryptionKey object
         """
 
         self.__main_window = Tk()
@@ -81,13 +1736,70 @@ class GUI:
         self.sidebar_width = 100
 
         # Initialize the address book itself to be a dict.
-        # This dict is the basis of the GUI's data.
-        self.__address_book = {}
+        # This dict is the basis of the GUI's data. A sharded address book
+        # works like a dict but keeps its contacts in several files.
+        if shards is not None:
+            self.__address_book = ShardedAddressBook(shards, partition)
+        else:
+            self.__address_book = {}
+        self.sharded = shards is not None
+
+        # Key of the encrypted address book, None if it is stored as plain text.
+        self.encryption_key = encryption_key
+
+        # Rows of the address book file which could not be parsed. They are
+        # kept so that they can be written back when the address book is saved.
+        self.__malformed_rows = []
+
+        # Contacts per city and region, kept up to date by add_contact and remove_contact.
+        self.statistics = AddressBookStatistics()
+
+        # Prefix search index of the contacts for the command palette.
+        self.search_index = ContactSearchIndex()
+
+        # Page slices and search results, invalidated by every change to the address book.
+        self.cache = ResultCache()
+
+        # The keys in alphabetical order, and the generation of the cache they were
+        # sorted in. They are kept apart from the cache so that the pages using them
+        # are not counted as extra cache lookups.
+        self.__sorted_keys = []
+        self.__sorted_keys_generation = None
+
+        # Changes to the address book are published as events for other programs.
+        # The events contain the contacts, so an encrypted address book keeps no
+        # event log in plain text and its events are only served on the socket.
+        if encryption_key is not None:
+            self.events = MutationEventStream(filename=None)
+        else:
+            self.events = MutationEventStream()
+        self.__events_flush_pending = None
+        self.__event_server = None
+        if event_port is not None:
+            self.__event_server = EventServer(self.events, event_port)
+            self.__event_server.start()
+
+        # State of the lazy loading mode. The rows before the position of __lazy_file
+        # are loaded, and __lazy_size is the size of the file for the progress message.
+        # A sharded address book is loaded in parallel instead, and an encrypted
+        # address book is decrypted in one go.
+        self.lazy_load = lazy_load and not self.sharded and encryption_key is None
+        self.loading = False
+        self.__lazy_file = None
+        self.__lazy_size = 0
+
+        # The frame currently laid out in the window.
+        self.__shown_frame = None
 
         # Create a dict of zip codes for city lookup feature of the GUI.
         self.__dict_of_zipcodes_and_cities = {}
         self.read_zip_code_city_file()
 
+        # The coordinates of the zip codes are optional. They are needed only for finding nearby contacts.
+        self.locator = ContactLocator({})
+        self.__coordinates_error = ""
+        self.read_zip_code_coordinates_file()
+
         # The GUI is comprised of three pieces. The sidebar, the title, and the content frame.
         self.__sidebar = Frame(self.__main_window)
         self.__title_frame = Frame(self.__main_window)
@@ -111,6 +1823,8 @@ class GUI:
         self.__sidebar.rowconfigure(1, weight=1)
         self.__sidebar.rowconfigure(2, weight=1)
         self.__sidebar.rowconfigure(3, weight=1)
+        self.__sidebar.rowconfigure(4, weight=1)
+        self.__sidebar.rowconfigure(5, weight=1)
         self.__sidebar.columnconfigure(0, minsize=self.sidebar_width)
 
         # The content frame has stretching enabled vertically and horizontally.
@@ -147,6 +1861,16 @@ class GUI:
                                       height=4,
                                       command=self.search_page)
 
+        self.__statistics_button = Button(self.__sidebar,
+                                          text="Statistics",
+                                          height=4,
+                                          command=self.statistics_page)
+
+        self.__nearby_button = Button(self.__sidebar,
+                                      text="Find Nearby",
+                                      height=4,
+                                      command=self.nearby_page)
+
         self.__quit_button = Button(self.__sidebar,
                                     text="Quit",
                                     height=4,
@@ -157,7 +1881,9 @@ class GUI:
         self.__add_to_address_book_page_button.grid(row=0, column=0, sticky=NSEW)
         self.__print_address_book_button.grid(row=1, column=0, sticky=NSEW)
         self.__search_button.grid(row=2, column=0, sticky=NSEW)
-        self.__quit_button.grid(row=3, column=0, sticky=NSEW)
+        self.__statistics_button.grid(row=3, column=0, sticky=NSEW)
+        self.__nearby_button.grid(row=4, column=0, sticky=NSEW)
+        self.__quit_button.grid(row=5, column=0, sticky=NSEW)
 
         # ** ADD ADDRESS PAGE OBJECTS **
 
@@ -269,6 +1995,7 @@ class GUI:
 
         # ** EDIT ADDRESS PAGE OBJECTS **
         self.edit_contact_object = None
+        self.edit_contact_key = None
 
         # Content Frame
         self.__edit_address_frame = Frame(self.__content_frame)
@@ -305,6 +2032,106 @@ class GUI:
                                                   width=15
                                                   )
 
+        # ** STATISTICS PAGE OBJECTS **
+
+        # Content Frame
+        self.__statistics_frame = Frame(self.__content_frame)
+
+        # Summary of the address book and the top lists are shown side by side below it.
+        self.__statistics_summary_label = Label(self.__statistics_frame, anchor=W, justify=LEFT)
+        self.__statistics_cities_label = Label(self.__statistics_frame, anchor=NW, justify=LEFT)
+        self.__statistics_regions_label = Label(self.__statistics_frame, anchor=NW, justify=LEFT)
+
+        # ** NEARBY PAGE OBJECTS **
+
+        # Content Frame
+        self.__nearby_frame = Frame(self.__content_frame)
+
+        # Search Field Objects
+        self.__nearby_zip_code_label = Label(self.__nearby_frame, text="Zip Code:")
+        self.__nearby_zip_code_data = Entry(self.__nearby_frame)
+        self.__nearby_amount_label = Label(self.__nearby_frame, text="Kilometres / Contacts:")
+        self.__nearby_amount_data = Entry(self.__nearby_frame)
+        self.__nearby_error_message = Label(self.__nearby_frame, text="")
+
+        # Action Buttons
+        self.__nearby_button_frame = Frame(self.__nearby_frame)
+
+        self.__nearby_within_button = Button(self.__nearby_button_frame,
+                                             text="Within Kilometres",
+                                             command=self.nearby_within,
+                                             height=2,
+                                             width=15
+                                             )
+        self.__nearby_nearest_button = Button(self.__nearby_button_frame,
+                                              text="Nearest Contacts",
+                                              command=self.nearby_nearest,
+                                              height=2,
+                                              width=15
+                                              )
+
+        # Results are shown a page at a time like in the address book page.
+        self.__nearby_results_frame = Frame(self.__nearby_frame)
+        self.__nearby_page_frame = Frame(self.__nearby_frame)
+        self.__nearby_back_page_button = Button(self.__nearby_page_frame,
+                                                text="<",
+                                                command=lambda: self.nearby_change_page(-1),
+                                                height=2,
+                                                width=10
+                                                )
+        self.__nearby_front_page_button = Button(self.__nearby_page_frame,
+                                                 text=">",
+                                                 command=lambda: self.nearby_change_page(1),
+                                                 height=2,
+                                                 width=10
+                                                 )
+        self.__nearby_page_label = Label(self.__nearby_page_frame)
+
+        # Contacts found by the latest nearby search and the page of them shown.
+        self.__nearby_results = []
+        self.__nearby_page = 1
+
+        # ** COMMAND PALETTE OBJECTS **
+
+        # The palette is a separate window opened with Ctrl+K. It lists the actions
+        # and contacts matching what the user types. Only the window is created
+        # here, it is shown and hidden by the palette methods.
+        self.__palette_window = Toplevel(self.__main_window)
+        self.__palette_window.title("Command Palette")
+        self.__palette_window.withdraw()
+        self.__palette_window.protocol("WM_DELETE_WINDOW", self.close_palette)
+
+        self.__palette_entry = Entry(self.__palette_window, width=50)
+        self.__palette_results_list = Listbox(self.__palette_window, height=PALETTE_RESULT_COUNT)
+        self.__palette_entry.pack(fill=X)
+        self.__palette_results_list.pack(expand=True, fill=BOTH)
+
+        # Actions which can be run from the palette, as (name, command) tuples.
+        self.__palette_actions = [("Add Contact", self.add_to_address_book_page),
+                                  ("Show Address Book", self.address_book_page),
+                                  ("Search Address Book", self.search_page),
+                                  ("Statistics", self.statistics_page),
+                                  ("Find Nearby", self.nearby_page),
+                                  ("Quit", self.stop)]
+
+        # The commands of the listed results, and the pending search of the palette.
+        self.__palette_commands = []
+        self.__palette_pending_search = None
+
+        # Tk's own Entry binding of Ctrl+K deletes the text after the cursor, and it
+        # would run before a bind_all binding. The Entry binding is replaced instead,
+        # and "break" keeps the bind_all binding from opening the palette twice.
+        # Ctrl+Shift+K, or Ctrl+K with Caps Lock on, works too.
+        for sequence in ("<Control-k>", "<Control-K>"):
+            self.__main_window.bind_class("Entry", sequence, self.palette_shortcut)
+            self.__main_window.bind_all(sequence, self.palette_shortcut)
+        self.__palette_entry.bind("<KeyRelease>", self.palette_key_released)
+        self.__palette_entry.bind("<Return>", self.palette_run_selected)
+        self.__palette_entry.bind("<Escape>", self.close_palette)
+        self.__palette_entry.bind("<Down>", lambda event: self.palette_move_selection(1))
+        self.__palette_entry.bind("<Up>", lambda event: self.palette_move_selection(-1))
+        self.__palette_results_list.bind("<Double-Button-1>", self.palette_run_selected)
+
         # Start the program on the Add Address Page.
         self.add_to_address_book_page()
 
@@ -357,6 +2184,9 @@ class GUI:
         Button action for when the "Add Contact" button is pressed on the "Add Contact Here" page
         """
 
+        # The whole address book is needed to detect duplicates and to save it.
+        self.finish_loading()
+
         # Create dictionary from the form input data to send to the input checker.
         form_input = {"first_name": self.__add_address_first_name_data.get(),
                       "last_name": self.__add_address_last_name_data.get(),
@@ -368,11 +2198,11 @@ class GUI:
 
         if contact_card is not None:
             # Construct a key from the object. Use lower() for key consistency and user-friendly search.
-            key = f"{contact_card.last_name},{contact_card.first_name}".lower()
+            key = contact_key(contact_card.first_name, contact_card.last_name)
 
             if key not in self.__address_book:
                 # Add contact card to the address book.
-                self.__address_book[key] = contact_card
+                self.add_contact(key, contact_card)
 
                 # Save addresses to text file.
                 self.save_address_book()
@@ -388,11 +2218,15 @@ class GUI:
                 # Notify user if a contact already exists in the address book.
                 self.__add_address_error_message_label.configure(text="Contact already exists!", fg="red")
 
-    def input_checker(self, form_input):
+    def input_checker(self, form_input, error_message_label=None):
         """
         This method verifies the entered data is not an empty string and verifies the zip code is valid.
+        :param form_input: dict of the entry field data
+        :param error_message_label: label for the error messages, defaults to the add contact page's label
         :return: Returns a contact card object if the input data is valid, otherwise returns None
         """
+        if error_message_label is None:
+            error_message_label = self.__add_address_error_message_label
 
         # As all the entry fields are compulsory in order for the program to function
         # correctly, it doesn't really matter in what order we check input. Thus we will
@@ -400,23 +2234,30 @@ class GUI:
 
         first_name = form_input["first_name"]
         if first_name == '':
-            self.__add_address_error_message_label.configure(text="Invalid first name!", fg="red")
+            error_message_label.configure(text="Invalid first name!", fg="red")
             return None
 
         last_name = form_input["last_name"]
         if last_name == '':
-            self.__add_address_error_message_label.configure(text="Invalid last name!", fg="red")
+            error_message_label.configure(text="Invalid last name!", fg="red")
             return None
 
         address = form_input["address"]
         if address == '':
-            self.__add_address_error_message_label.configure(text="Invalid address!", fg="red")
+            error_message_label.configure(text="Invalid address!", fg="red")
             return None
 
+        # Semicolons and newlines separate the data in the txt-file, so they would
+        # corrupt the address book if they were saved.
+        for value in form_input.values():
+            if ";" in value or "\n" in value:
+                error_message_label.configure(text="Semicolons and newlines are not allowed!", fg="red")
+                return None
+
         zip_code = form_input["zip_code"]
         # Instead of only checking for empty string, the zip code field is checked for validity.
         if zip_code not in self.__dict_of_zipcodes_and_cities:
-            self.__add_address_error_message_label.configure(text="Unknown zipcode!", fg="red")
+            error_message_label.configure(text="Unknown zipcode!", fg="red")
             return None
 
         # If the entered fields are valid, the city is looked up
@@ -468,9 +2309,6 @@ class GUI:
         # Allow button frame to stretch in the middle, but keep the buttons the same size.
         self.__address_book_button_frame.columnconfigure(1, weight=1)
 
-        # Label the page number.
-        self.__address_book_page_label.configure(text=self.__current_page)
-
         # Find the number of addresses in the book.
         self.number_of_addresses = len(self.__address_book)
 
@@ -481,27 +2319,63 @@ class GUI:
         if last_page != 0:
             self.number_of_pages += 1
 
-        # Reset error message text.
-        self.__address_book_error_message.configure(text="")
+        # Contacts may have been deleted since the page was last shown,
+        # so the current page may be past the last page.
+        self.__current_page = max(1, min(self.__current_page, self.number_of_pages))
+
+        # Label the page number and reset error message text. While a lazily loaded
+        # address book is still loading, the pages only contain the contacts loaded
+        # so far and may change, which the label tells on every page.
+        if self.loading:
+            self.__address_book_page_label.configure(text=f"{self.__current_page} (partial)")
+            self.__address_book_error_message.configure(
+                text=f"Showing the contacts loaded so far.\n{self.loading_message()}")
+        else:
+            self.__address_book_page_label.configure(text=self.__current_page)
+            self.__address_book_error_message.configure(text="")
 
-        # Create a list of the contact card objects.
-        contacts_list = []
-        for key in sorted(self.__address_book):
-            contact = self.__address_book[key]
-            contacts_list.append(contact)
+        # Create a list of the contact card objects of the current page.
+        # Pages the user has already visited come from the cache.
+        contacts_list = list(self.cache.get(("page", self.__current_page, self.page_size), self.page_contacts))
 
-        # Add empty contact cards to the end of the list to make a
-        # number of contact cards divisible by the page size
-        for j in range(self.page_size-last_page):
+        # Add empty contact cards to the end of the list to fill the page.
+        while len(contacts_list) < self.page_size:
             contact_card = ContactCard("", "", "", "", "")
             contacts_list.append(contact_card)
 
         # Display contact cards in frames, handled by print_one_address.
         for i in range(self.page_size):
-            # Calculate the index of the list based on the current page, page size, and index.
-            index = (self.__current_page - 1) * self.page_size + i
-            contact = contacts_list[index]
-            self.print_one_address(contact, i, self.__address_results_frame)
+            self.print_one_address(contacts_list[i], i, self.__address_results_frame)
+
+    def page_contacts(self):
+        """
+        :return: list of the contact card objects on the current page
+        """
+        # Calculate the index of the first contact based on the current page and page size.
+        first_index = (self.__current_page - 1) * self.page_size
+
+        # The sorted keys are a list, so the page is sliced without walking the keys before it.
+        contacts_list = []
+        for key in self.sorted_keys()[first_index:first_index + self.page_size]:
+            contact = self.__address_book[key]
+            contacts_list.append(contact)
+
+        return contacts_list
+
+    def sorted_keys(self):
+        """
+        :return: list of the address book keys in alphabetical order. The keys
+                 of a sharded address book are merged from its sorted shards.
+                 The list is kept until the address book changes.
+        """
+        if self.__sorted_keys_generation != self.cache.generation:
+            if self.sharded:
+                self.__sorted_keys = list(self.__address_book)
+            else:
+                self.__sorted_keys = sorted(self.__address_book)
+            self.__sorted_keys_generation = self.cache.generation
+
+        return self.__sorted_keys
 
     def back_button(self):
         """
@@ -522,6 +2396,8 @@ class GUI:
 
             self.__current_page += 1
             self.address_book_page()
+        elif self.loading:
+            self.__address_book_error_message.configure(text=f"At end of loaded pages.\n{self.loading_message()}")
         else:
             self.__address_book_error_message.configure(text="At end of pages")
 
@@ -598,11 +2474,18 @@ class GUI:
             # Construct a key from the search data field
             full_name = self.__search_name_data.get()
             firstname, lastname = full_name.split(" ")
-            key = f"{lastname},{firstname}".lower()
+            key = contact_key(firstname, lastname)
+
+            # Searches repeated before the address book changes come from the cache.
+            # A search during lazy loading loads more rows, so it is not cached.
+            if self.loading:
+                contact = self.find_contact(key)
+            else:
+                contact = self.cache.get(("search", key), lambda: self.find_contact(key))
 
             # Print the information for the associated contact if it exists
-            if key in self.__address_book:
-                self.print_one_address(self.__address_book[key], 1, self.__search_frame)
+            if contact is not None:
+                self.print_one_address(contact, 1, self.__search_frame)
 
             # Handle if the contact does not exist
             else:
@@ -612,6 +2495,20 @@ class GUI:
         except ValueError:
             self.__search_error_message.configure(text="\nSearch with first and last name.")
 
+    def find_contact(self, key):
+        """
+        Looks up a contact for the search.
+        :param key: address book key of the contact, str
+        :return: ContactCard object, or None if the contact is not in the address book
+        """
+        contact = self.__address_book.get(key)
+
+        # The contact may also be in the part of a lazily loaded address book not loaded yet.
+        if contact is None:
+            contact = self.find_unloaded_contact(key)
+
+        return contact
+
     # -- EDIT CONTACT FEATURE ON SEARCH PAGE --
 
     def edit_address_page(self):
@@ -625,6 +2522,9 @@ class GUI:
         # Change the title accordingly.
         self.__title_label.configure(text="Edit Contact\n")
 
+        # Clear the fields of a previous edit which was not saved.
+        self.edit_address_reset_fields()
+
         # Get contact which is being edited from the edit-method.
         contact = self.edit_contact_object
 
@@ -656,6 +2556,15 @@ class GUI:
         self.__edit_address_clear_button.pack(side='right', expand=True, fill=BOTH)
 
     def edit_address(self):
+        """
+        Button action for when the "Save" button is pressed on the edit page. The edited
+        contact replaces the old contact only when it is saved, so an edit which is
+        not saved leaves the address book as it was.
+        """
+
+        if self.edit_contact_key not in self.__address_book:
+            self.__edit_address_error_message_label.configure(text="Search for a contact to edit first!", fg="red")
+            return
 
         # Create a dictionary from the contact data. This makes the use of
         # input checker-method easier.
@@ -664,24 +2573,28 @@ class GUI:
                       "address": self.__edit_address_street_address_data.get(),
                       "zip_code": self.__edit_address_zip_code_data.get()}
 
-        contact_card = self.input_checker(form_input)
+        contact_card = self.input_checker(form_input, self.__edit_address_error_message_label)
 
         # Input checker returns None if the contact is invalid.
         if contact_card is not None:
-            key = f"{contact_card.last_name},{contact_card.first_name}".lower()
+            key = contact_key(contact_card.first_name, contact_card.last_name)
 
-            if key not in self.__address_book:
-                self.__address_book[key] = contact_card
+            # The name can be changed only to a name which is not in the address book yet.
+            if key == self.edit_contact_key or key not in self.__address_book:
+                self.replace_contact(self.edit_contact_key, key, contact_card)
+                self.edit_contact_key = None
 
                 # After editing the contact in a similar fashion as in the add contact-method,
                 # we save the address book to ensure no data is lost.
                 self.save_address_book()
 
+                self.edit_address_reset_fields()
+
                 # Display a message to the interface that the edit was successful.
-                new_label = Label(self.__edit_address_frame, text="Contact edited successfully!", fg="green")
-                new_label.grid(row=4, columnspan=2)
+                self.__edit_address_error_message_label.configure(text="Contact edited successfully!", fg="green")
 
-                self.edit_address_reset_fields()
+            else:
+                self.__edit_address_error_message_label.configure(text="Contact already exists!", fg="red")
 
     def delete(self):
         """
@@ -689,6 +2602,8 @@ class GUI:
         address book.
         """
 
+        self.finish_loading()
+
         try:
             # Make sure error message label doesn't display an old message.
             self.__search_error_message.configure(text=" ")
@@ -696,12 +2611,12 @@ class GUI:
             # As user input is in one entry-field we separate user input into two variables.
             full_name = self.__search_name_data.get()
             firstname, last_name = full_name.split(" ")
-            key = f"{last_name},{firstname}".lower()
+            key = contact_key(firstname, last_name)
 
             if key in self.__address_book:
 
                 # This deletes the contact object at it's key.
-                del self.__address_book[key]
+                self.remove_contact(key)
 
                 # Destroy the displayed contact frame and update the address book accordingly.
                 self.__contact_frame.destroy()
@@ -722,19 +2637,20 @@ class GUI:
         with an edited one. Similar structure to delete.
         """
 
+        self.finish_loading()
+
         try:
             self.__search_error_message.configure(text=" ")
             full_name = self.__search_name_data.get()
             firstname, last_name = full_name.split(" ")
-            key = f"{last_name},{firstname}".lower()
+            key = contact_key(firstname, last_name)
 
             if key in self.__address_book:
 
                 # Assigns an edit contact object according to search entry field data.
+                # The contact stays in the address book until the edit is saved.
                 self.edit_contact_object = self.__address_book[key]
-
-                # Deletes the old, unedited contact.
-                del self.__address_book[key]
+                self.edit_contact_key = key
 
                 # Opens the edit-page where user can edit the contact.
                 self.edit_address_page()
@@ -755,18 +2671,379 @@ class GUI:
         self.__edit_address_zip_code_data.delete(0, 'end')
         self.__edit_address_error_message_label.configure(text="")
 
+    # *********************
+    # *  STATISTICS PAGE  *
+    # *********************
+
+    def statistics_page(self):
+        """
+        This method opens the statistics page. The statistics are read from the
+        counters, so opening the page takes time only in proportion to the number of cities.
+        """
+        # The statistics describe the whole address book.
+        self.finish_loading()
+
+        self.reset_page(self.__statistics_frame)
+
+        self.__title_label.configure(text="Statistics\n")
+
+        # The top lists share the width of the page.
+        self.__statistics_frame.columnconfigure(0, weight=1)
+        self.__statistics_frame.columnconfigure(1, weight=1)
+        self.__statistics_frame.rowconfigure(1, weight=1)
+
+        self.__statistics_summary_label.grid(row=0, columnspan=2, sticky=NSEW)
+        self.__statistics_cities_label.grid(row=1, column=0, sticky=NSEW)
+        self.__statistics_regions_label.grid(row=1, column=1, sticky=NSEW)
+
+        self.__statistics_summary_label.configure(
+            text=f"Contacts: {self.statistics.number_of_contacts}\n"
+                 f"Cities: {len(self.statistics.cities)}\n"
+                 f"Zip code regions: {len(self.statistics.regions)}\n"
+                 f"Page and search cache: {self.cache.hits} hits, {self.cache.misses} misses "
+                 f"({self.cache.hit_rate():.0%} hit rate)\n")
+
+        top_cities = "\n".join(f"{city}: {count}" for city, count in self.statistics.top_cities())
+        self.__statistics_cities_label.configure(text=f"Top cities:\n{top_cities}")
+
+        top_regions = "\n".join(f"{region}xxx: {count}" for region, count in self.statistics.top_regions())
+        self.__statistics_regions_label.configure(text=f"Top zip code regions:\n{top_regions}")
+
+    # *********************
+    # *  COMMAND PALETTE  *
+    # *********************
+
+    def open_palette(self, event=None):
+        """
+        Opens the command palette window and focuses its entry field.
+        """
+        self.__palette_window.deiconify()
+        self.__palette_window.lift()
+        self.__palette_entry.delete(0, 'end')
+        self.__palette_entry.focus_set()
+        self.palette_search()
+
+    def palette_shortcut(self, event=None):
+        """
+        Opens the command palette from the keyboard shortcut.
+        :return: "break", so that no other binding of the shortcut runs
+        """
+        self.open_palette()
+        return "break"
+
+    def close_palette(self, event=None):
+        """
+        Hides the command palette window and cancels a pending search.
+        """
+        if self.__palette_pending_search is not None:
+            self.__main_window.after_cancel(self.__palette_pending_search)
+            self.__palette_pending_search = None
+
+        self.__palette_window.withdraw()
+
+    def palette_key_released(self, event):
+        """
+        Schedules a palette search after a keystroke. A search scheduled by an earlier
+        keystroke is cancelled, so only the query of the latest keystroke is searched.
+        """
+        # Keys handled by their own bindings do not change the query.
+        if event.keysym in ("Return", "Escape", "Up", "Down"):
+            return
+
+        if self.__palette_pending_search is not None:
+            self.__main_window.after_cancel(self.__palette_pending_search)
+
+        self.__palette_pending_search = self.__main_window.after(PALETTE_DELAY_MS, self.palette_search)
+
+    def palette_search(self):
+        """
+        Lists the actions and contacts matching the text of the palette entry field.
+        Actions match anywhere in their name, contacts by the beginning of their
+        name (in either order) or city.
+        """
+        self.__palette_pending_search = None
+
+        query = self.__palette_entry.get().strip().lower()
+
+        self.__palette_results_list.delete(0, 'end')
+        self.__palette_commands = []
+
+        for name, command in self.__palette_actions:
+            if query in name.lower():
+                self.__palette_results_list.insert('end', name)
+                self.__palette_commands.append(command)
+
+        if query != "":
+            for key in self.search_index.search(query):
+                contact = self.__address_book[key]
+                self.__palette_results_list.insert(
+                    'end', f"{contact.first_name} {contact.last_name}, {contact.zip_code} {contact.city}")
+                self.__palette_commands.append(lambda contact=contact: self.show_contact(contact))
+
+        if self.loading:
+            self.__palette_results_list.insert('end', self.loading_message())
+            self.__palette_commands.append(None)
+
+        self.__palette_results_list.selection_set(0)
+
+    def palette_move_selection(self, step):
+        """
+        Moves the selection of the palette results up or down.
+        :param step: -1 to move up, 1 to move down, int
+        """
+        selection = self.__palette_results_list.curselection()
+        index = selection[0] + step if selection else 0
+        index = max(0, min(index, len(self.__palette_commands) - 1))
+
+        self.__palette_results_list.selection_clear(0, 'end')
+        self.__palette_results_list.selection_set(index)
+        self.__palette_results_list.see(index)
+
+    def palette_run_selected(self, event=None):
+        """
+        Runs the command of the selected palette result and closes the palette.
+        """
+        # A search still pending is run first, so the results match the entry field.
+        if self.__palette_pending_search is not None:
+            self.__main_window.after_cancel(self.__palette_pending_search)
+            self.palette_search()
+
+        selection = self.__palette_results_list.curselection()
+        if not selection or self.__palette_commands[selection[0]] is None:
+            return
+
+        command = self.__palette_commands[selection[0]]
+        self.close_palette()
+        command()
+
+    def show_contact(self, contact):
+        """
+        Opens the search page with the contact searched, so it can be edited or deleted.
+        :param contact: ContactCard object
+        """
+        self.search_page()
+        self.__search_name_data.delete(0, 'end')
+        self.__search_name_data.insert(0, f"{contact.first_name} {contact.last_name}")
+        self.search()
+
+    # *********************
+    # *    NEARBY PAGE    *
+    # *********************
+
+    def nearby_page(self):
+        """
+        This method opens the page in which the user can find the contacts
+        near a zip code, and places the objects in the grid.
+        """
+        # The nearby contacts are searched from the whole address book.
+        self.finish_loading()
+
+        self.reset_page(self.__nearby_frame)
+
+        self.__title_label.configure(text="Find Nearby\n")
+
+        # Entry fields stretch horizontally and the results vertically.
+        self.__nearby_frame.columnconfigure(1, weight=1)
+        self.__nearby_frame.rowconfigure(4, weight=1)
+
+        self.__nearby_zip_code_label.grid(row=0, column=0, sticky=NSEW)
+        self.__nearby_zip_code_data.grid(row=0, column=1, sticky=NSEW)
+        self.__nearby_amount_label.grid(row=1, column=0, sticky=NSEW)
+        self.__nearby_amount_data.grid(row=1, column=1, sticky=NSEW)
+
+        self.__nearby_button_frame.grid(row=2, columnspan=2, sticky=NSEW)
+        self.__nearby_within_button.pack(side='left', expand=True, fill=BOTH)
+        self.__nearby_nearest_button.pack(side='right', expand=True, fill=BOTH)
+
+        self.__nearby_error_message.grid(row=3, columnspan=2, sticky=NSEW)
+        self.__nearby_results_frame.grid(row=4, columnspan=2, sticky=NSEW)
+
+        self.__nearby_page_frame.grid(row=5, columnspan=2, sticky=NSEW)
+        self.__nearby_back_page_button.grid(row=0, column=0, sticky=W)
+        self.__nearby_page_label.grid(row=0, column=1, sticky=NSEW)
+        self.__nearby_front_page_button.grid(row=0, column=2, sticky=E)
+        self.__nearby_page_frame.columnconfigure(1, weight=1)
+
+        if not self.locator.available():
+            self.__nearby_error_message.configure(text=self.__coordinates_error, fg="red")
+
+    def nearby_input(self, convert):
+        """
+        Reads the zip code and the amount of the nearby page's entry fields.
+        :param convert: float or int, converts the amount
+        :return: the zip code and the amount, or None if the input is not valid
+        """
+        zip_code = self.__nearby_zip_code_data.get().strip()
+
+        if not self.locator.available():
+            self.__nearby_error_message.configure(text=self.__coordinates_error, fg="red")
+            return None
+
+        if zip_code not in self.locator.coordinates:
+            self.__nearby_error_message.configure(text="No coordinates for the zipcode!", fg="red")
+            return None
+
+        try:
+            amount = convert(self.__nearby_amount_data.get())
+        except ValueError:
+            amount = 0
+
+        # float() also accepts "inf" and "nan", which no distance can be compared with.
+        if not math.isfinite(amount) or amount <= 0:
+            self.__nearby_error_message.configure(text="Invalid number!", fg="red")
+            return None
+
+        return zip_code, amount
+
+    def nearby_within(self):
+        """
+        Button action for finding the contacts within a distance of a zip code.
+        """
+        nearby_input = self.nearby_input(float)
+        if nearby_input is not None:
+            zip_code, radius_km = nearby_input
+            self.show_nearby_results(self.locator.within(zip_code, radius_km))
+
+    def nearby_nearest(self):
+        """
+        Button action for finding the contacts nearest to a zip code.
+        """
+        nearby_input = self.nearby_input(int)
+        if nearby_input is not None:
+            zip_code, count = nearby_input
+            self.show_nearby_results(self.locator.nearest(zip_code, count))
+
+    def show_nearby_results(self, results):
+        """
+        Shows the first page of the contacts found.
+        :param results: list of (distance in km, address book key) tuples
+        """
+        self.__nearby_results = [self.__address_book[key] for distance, key in results]
+        self.__nearby_page = 1
+        self.__nearby_error_message.configure(text=f"{len(results)} contact(s) found.", fg="black")
+        self.nearby_change_page(0)
+
+    def nearby_change_page(self, step):
+        """
+        Moves to another page of the nearby results and displays the contacts on it.
+        :param step: -1 for the previous page, 1 for the next page and 0 for the same page, int
+        """
+        number_of_pages = max(1, -(-len(self.__nearby_results) // self.page_size))
+        self.__nearby_page = max(1, min(self.__nearby_page + step, number_of_pages))
+        self.__nearby_page_label.configure(text=self.__nearby_page)
+
+        # Display contact cards in frames, handled by print_one_address like in the address book page.
+        first_index = (self.__nearby_page - 1) * self.page_size
+        for i in range(self.page_size):
+            if first_index + i < len(self.__nearby_results):
+                contact = self.__nearby_results[first_index + i]
+            else:
+                contact = ContactCard("", "", "", "", "")
+            self.print_one_address(contact, i, self.__nearby_results_frame)
+
+    # **********************
+    # *  ADDRESS BOOK DATA *
+    # **********************
+
+    def add_contact(self, key, contact_card):
+        """
+        Adds a contact to the address book dictionary. All changes to the
+        address book go through this method and remove_contact, so that
+        everything derived from the address book stays up to date.
+        :param key: address book key of the contact, str
+        :param contact_card: ContactCard object
+        """
+        self.__address_book[key] = contact_card
+        self.statistics.add(contact_card)
+        self.search_index.add(key, contact_card)
+        self.locator.add(key, contact_card)
+        self.cache.invalidate()
+        self.publish_event(EVENT_ADD, key, None, contact_card)
+
+    def remove_contact(self, key):
+        """
+        Removes a contact from the address book dictionary.
+        :param key: address book key of the contact, str
+        :return: the removed ContactCard object
+        """
+        contact_card = self.__address_book.pop(key)
+        self.statistics.remove(contact_card)
+        self.search_index.remove(key, contact_card)
+        self.locator.remove(key, contact_card)
+        self.cache.invalidate()
+        self.publish_event(EVENT_DELETE, key, contact_card, None)
+        return contact_card
+
+    def replace_contact(self, old_key, key, contact_card):
+        """
+        Replaces a contact with its edited version. The key changes if the name was edited.
+        :param old_key: address book key of the contact before the edit, str
+        :param key: address book key of the edited contact, str
+        :param contact_card: edited ContactCard object
+        """
+        old_contact_card = self.__address_book.pop(old_key)
+        self.statistics.remove(old_contact_card)
+        self.search_index.remove(old_key, old_contact_card)
+        self.locator.remove(old_key, old_contact_card)
+
+        self.__address_book[key] = contact_card
+        self.statistics.add(contact_card)
+        self.search_index.add(key, contact_card)
+        self.locator.add(key, contact_card)
+        self.cache.invalidate()
+
+        # A renamed contact is published as an edit of the new key.
+        self.publish_event(EVENT_EDIT, key, old_contact_card, contact_card)
+
+    def publish_event(self, kind, key, old_contact, new_contact):
+        """
+        Publishes a change to the address book. If the batch of events is not
+        full yet, it is delivered shortly after from the mainloop.
+        :param kind: EVENT_ADD, EVENT_EDIT or EVENT_DELETE, str
+        :param key: address book key of the contact, str
+        :param old_contact: ContactCard object before the change, or None
+        :param new_contact: ContactCard object after the change, or None
+        """
+        delivered = self.events.publish(kind, key, old_contact, new_contact)
+
+        if delivered and self.__events_flush_pending is not None:
+            self.__main_window.after_cancel(self.__events_flush_pending)
+            self.__events_flush_pending = None
+
+        elif not delivered and self.__events_flush_pending is None:
+            self.__events_flush_pending = self.__main_window.after(EVENT_FLUSH_DELAY_MS, self.flush_events)
+
+    def flush_events(self):
+        """
+        Delivers the events waiting in the event stream.
+        """
+        self.__events_flush_pending = None
+        self.events.flush()
+
     def stop(self):
         """
         Ends the execution of the program.
         """
 
+        # Events which are still waiting are delivered before quitting.
+        self.events.flush()
+        if self.__event_server is not None:
+            self.__event_server.shutdown()
+
+        if self.sharded:
+            self.__address_book.close()
+
         self.__main_window.destroy()
 
     def start(self):
         """
         Starts the mainloop.
         """
-        self.load_address_book()
+        if self.lazy_load:
+            self.start_lazy_load()
+        else:
+            self.load_address_book()
+
         self.__main_window.mainloop()
 
     def save_address_book(self):
@@ -775,23 +3052,37 @@ class GUI:
         address book dictionary into a txt-file.
         """
 
-        filename = "address_book.txt"
+        # A sharded address book saves only the shards which have changed.
+        if self.sharded:
+            self.__address_book.save()
+            return
 
         # Opens the file using the "write" mode. Thus every time this method
         # is called, the whole txt-file is rewritten. This takes care of
-        # duplicate contacts in the txt-file itself.
-        file = open(filename, mode="w")
+        # duplicate contacts in the txt-file itself. An encrypted address book
+        # is encrypted chunk by chunk while it is written.
+        if self.encryption_key is not None:
+            file = EncryptedWriter(ENCRYPTED_ADDRESS_BOOK_FILENAME, self.encryption_key)
+        else:
+            file = open(ADDRESS_BOOK_FILENAME, mode="w", encoding="utf-8")
 
         for address in self.__address_book.values():
 
             # Semicolon is used to separate the data in the txt-file.
-            line = f"{address.first_name};{address.last_name};" \
-                   f"{address.address};{address.zip_code};{address.city}\n"
+            file.write(contact_to_row(address))
 
-            file.write(line)
+        # Rows which could not be loaded are written back as they were,
+        # so that saving never loses data the program did not understand.
+        for row in self.__malformed_rows:
+            file.write(row)
 
         file.close()
 
+        # Once the contacts have been saved encrypted, the plain text copy
+        # the encrypted address book was created from is removed.
+        if self.encryption_key is not None and os.path.exists(ADDRESS_BOOK_FILENAME):
+            os.remove(ADDRESS_BOOK_FILENAME)
+
     def load_address_book(self):
         """
         A data persistence method which is called every time the program runs.
@@ -799,30 +3090,198 @@ class GUI:
         by the program. Method is called in the start-method.
         """
 
-        filename = "address_book.txt"
+        # The shards of a sharded address book are loaded in parallel.
+        if self.sharded:
+            self.address_book_loaded(self.__address_book.load(ADDRESS_BOOK_FILENAME))
+            return
 
-        file = open(filename, mode="r")
+        # An encrypted address book is decrypted chunk by chunk while it is read.
+        # The first time, the contacts are read from the plain text file instead.
+        if self.encryption_key is not None and os.path.exists(ENCRYPTED_ADDRESS_BOOK_FILENAME):
+            for row in read_encrypted_rows(ENCRYPTED_ADDRESS_BOOK_FILENAME, self.encryption_key):
+                self.add_loaded_row(row)
 
-        for row in file:
+        else:
+            file = open(ADDRESS_BOOK_FILENAME, mode="r", encoding="utf-8")
 
-            address_variables = row.rstrip().split(";")
+            for row in file:
+                self.add_loaded_row(row)
+
+            file.close()
+
+            # The plain text address book is encrypted and removed right away,
+            # instead of staying on the disk until the first change.
+            if self.encryption_key is not None:
+                self.save_address_book()
 
-            firstname = address_variables[0]
-            lastname = address_variables[1]
-            address = address_variables[2]
-            zipcode = address_variables[3]
-            city = address_variables[4]
+        self.address_book_loaded(len(self.__malformed_rows))
 
+    def add_loaded_row(self, row):
+        """
+        Adds a row of the address book file to the address book dictionary.
+        :param row: row of the address book file, str
+        :return: key of the contact if it was added, None for a malformed row or a duplicate
+        """
+
+        try:
             # Creates a contact card object according to the data in the txt-file.
-            contact_card = ContactCard(firstname, lastname,
-                                       address, zipcode, city)
+            contact_card = row_to_contact(row)
 
-            key = f"{lastname},{firstname}".lower()
+        # Malformed rows are kept aside instead of crashing the program.
+        # They can be inspected and repaired with the --check and --repair options.
+        except ValueError:
+            self.__malformed_rows.append(row if row.endswith("\n") else row + "\n")
+            return None
 
-            # If person is not yet in the address book, add the contact.
-            # This statement takes care of duplicates.
-            if key not in self.__address_book:
-                self.__address_book[key] = contact_card
+        key = contact_key(contact_card.first_name, contact_card.last_name)
+
+        # If person is not yet in the address book, add the contact.
+        # This statement takes care of duplicates. The caller counts and
+        # indexes the added contacts.
+        if key in self.__address_book:
+            return None
+
+        self.__address_book[key] = contact_card
+        return key
+
+    def address_book_loaded(self, number_of_malformed_rows):
+        """
+        Called once the whole address book file has been loaded.
+        :param number_of_malformed_rows: number of rows which could not be loaded, int
+        """
+        self.statistics.recompute(self.__address_book.values())
+        self.search_index.rebuild(self.__address_book)
+        self.locator.rebuild(self.__address_book)
+        self.cache.invalidate()
+
+        self.report_malformed_rows(number_of_malformed_rows)
+
+    def report_malformed_rows(self, number_of_malformed_rows):
+        """
+        Tells the user about the rows of the address book file which could not be loaded.
+        :param number_of_malformed_rows: number of rows which could not be loaded, int
+        """
+        if number_of_malformed_rows:
+            self.__add_address_error_message_label.configure(
+                text=f"{number_of_malformed_rows} malformed row(s) in the address book.\n"
+                     f"Run the program with --check to see them.", fg="red")
+
+    # -- LAZY LOADING --
+
+    def start_lazy_load(self):
+        """
+        Starts loading the address book lazily. Only the first rows are parsed before
+        the window is shown. The rest of the rows are parsed in chunks between the
+        events of the mainloop, so the file is read only once.
+        """
+        self.__lazy_file = open(ADDRESS_BOOK_FILENAME, mode="rb")
+        self.__lazy_size = os.fstat(self.__lazy_file.fileno()).st_size
+        self.loading = True
+
+        self.load_rows(LAZY_LOAD_FIRST_CHUNK)
+
+        if self.loading:
+            self.__main_window.after(1, self.load_next_chunk)
+
+    def load_rows(self, number_of_rows, key=None):
+        """
+        Parses the next rows of a lazily loaded address book. When the end of the
+        file is reached, the loading is finished.
+        :param number_of_rows: maximum number of rows to parse, int
+        :param key: if given, parsing stops as soon as this contact has been loaded, str
+        """
+        loaded_contacts = []
+        end_of_file = False
+
+        # The rows are read in order, so no seeking is needed here.
+        for _ in range(number_of_rows):
+            row = self.__lazy_file.readline()
+
+            if not row:
+                end_of_file = True
+                break
+
+            loaded_key = self.add_loaded_row(row.decode("utf-8"))
+
+            if loaded_key is not None:
+                loaded_contacts.append((loaded_key, self.__address_book[loaded_key]))
+                if loaded_key == key:
+                    break
+
+        # The statistics, the palette and the nearby search are updated chunk by
+        # chunk, so they see the contacts loaded so far and no single step of the
+        # event loop has to go through the whole address book.
+        for loaded_key, contact in loaded_contacts:
+            self.statistics.add(contact)
+            self.locator.add(loaded_key, contact)
+        self.search_index.add_many(loaded_contacts)
+
+        # The pages and searches change as more contacts are loaded.
+        self.cache.invalidate()
+
+        if end_of_file:
+            self.lazy_load_finished()
+
+    def load_next_chunk(self):
+        """
+        Parses the next chunk of rows of a lazily loaded address book and schedules
+        the following chunk, so that the window stays responsive while loading.
+        """
+        # The loading may have been finished in the meantime by a change or a search.
+        if not self.loading:
+            return
+
+        self.load_rows(LAZY_LOAD_CHUNK_SIZE)
+
+        if self.loading:
+            self.__main_window.after(1, self.load_next_chunk)
+
+    def lazy_load_finished(self):
+        """
+        Called when a lazily loaded address book has been read to the end.
+        """
+        self.__lazy_file.close()
+        self.loading = False
+        self.report_malformed_rows(len(self.__malformed_rows))
+
+        # The address book page showed only the contacts loaded so far.
+        if self.__shown_frame is self.__address_book_frame:
+            self.address_book_page()
+
+    def finish_loading(self):
+        """
+        Loads the rest of a lazily loaded address book right away. This is called
+        before the address book is changed, so that a save never drops unloaded
+        rows and duplicates are detected against the whole book.
+        """
+        while self.loading:
+            self.load_rows(LAZY_LOAD_CHUNK_SIZE)
+
+    def find_unloaded_contact(self, key):
+        """
+        Looks for a contact in the rows a lazily loaded address book has not loaded yet.
+        The rows are loaded until the contact is found, so the next search starts from
+        where this one stopped instead of reading the same rows again.
+        :param key: address book key of the contact, str
+        :return: ContactCard object, or None if the contact is not in the unloaded rows
+        """
+        while self.loading:
+            self.load_rows(LAZY_LOAD_CHUNK_SIZE, key)
+
+            if key in self.__address_book:
+                return self.__address_book[key]
+
+        return None
+
+    def loading_message(self):
+        """
+        :return: progress of a lazily loaded address book for the user, str
+        """
+        # The file is closed once it has been loaded.
+        position = self.__lazy_size if self.__lazy_file.closed else self.__lazy_file.tell()
+        percentage = 100 * position // max(self.__lazy_size, 1)
+
+        return f"Loading address book... {percentage} %"
 
     def read_zip_code_city_file(self):
         """
@@ -832,16 +3291,9 @@ class GUI:
         and as a sort-of autofill feature.
         """
 
-        filename = "zipcodes_and_cities.txt"
-
         try:
 
-            file = open(filename, mode="r")
-
-            for row in file:
-                zip_code, city = row.rstrip().split(";")
-
-                self.__dict_of_zipcodes_and_cities[zip_code] = city
+            self.__dict_of_zipcodes_and_cities = read_zip_code_table(ZIPCODES_FILENAME)
 
         # As the program needs this file to be in the correct format and exist,
         # if an error occurs, the program shuts down.
@@ -858,6 +3310,67 @@ class GUI:
             time.sleep(10)
             self.stop()
 
+    def read_zip_code_coordinates_file(self):
+        """
+        This method reads the optional txt-file zipcodes_coordinates, which has the
+        coordinates of the zip codes for finding nearby contacts. Unlike the zip code
+        file, the program works without it.
+        """
+
+        try:
+            self.locator = ContactLocator(read_zip_code_coordinates(COORDINATES_FILENAME))
+
+        except FileNotFoundError:
+            self.__coordinates_error = f"Coordinates file {COORDINATES_FILENAME} not found!"
+
+        # A broken file is told apart from a missing one, so the user knows to fix it.
+        except ValueError as error:
+            self.__coordinates_error = f"Coordinates file {COORDINATES_FILENAME} is malformed:\n{error}!"
+
+        except OSError as error:
+            self.__coordinates_error = f"Coordinates file {COORDINATES_FILENAME} cannot be read:\n{error.strerror}!"
+
+        else:
+            if not self.locator.available():
+                self.__coordinates_error = f"Coordinates file {COORDINATES_FILENAME} is empty!"
+
+    # -- ACCESS FOR TESTS --
+
+    def contacts(self):
+        """
+        :return: the address book, key -> ContactCard object. It must not be changed directly.
+        """
+        return self.__address_book
+
+    def current_page(self):
+        """
+        :return: number of the page shown on the address book page, int
+        """
+        return self.__current_page
+
+    def page_label(self):
+        """
+        :return: text of the page number label of the address book page, str
+        """
+        return str(self.__address_book_page_label.cget("text"))
+
+    def form_entries(self, form):
+        """
+        :param form: "add", "edit", "search" or "nearby", str
+        :return: entry fields of the form, first name, last name, address and zip code
+                 for "add" and "edit", the name for "search", the zip code and the
+                 distance or number of contacts for "nearby", tuple
+        """
+        if form == "add":
+            return (self.__add_address_first_name_data, self.__add_address_last_name_data,
+                    self.__add_address_street_address_data, self.__add_address_zip_code_data)
+        if form == "edit":
+            return (self.__edit_address_first_name_data, self.__edit_address_last_name_data,
+                    self.__edit_address_street_address_data, self.__edit_address_zip_code_data)
+        if form == "nearby":
+            return (self.__nearby_zip_code_data, self.__nearby_amount_data)
+        return (self.__search_name_data,)
+
     def reset_page(self, frame):
         """
         Resets a the grid layout of all of the page frames, then lays
@@ -870,13 +3383,196 @@ class GUI:
         self.__address_book_frame.grid_forget()
         self.__search_frame.grid_forget()
         self.__edit_address_frame.grid_forget()
+        self.__statistics_frame.grid_forget()
+        self.__nearby_frame.grid_forget()
 
         # Layout the frame passed to the method, which then lets the objects it contains be laid out in the frame.
         frame.grid(sticky=NSEW)
+        self.__shown_frame = frame
+
+
+def check_address_book_command(repair, encryption_key):
+    """
+    Checks the address book against the zip code table from the command line
+    and prints a report of the problems. Optionally repairs the address book.
+    :param repair: True if the found problems should be repaired, bool
+    :param encryption_key: EncryptionKey object of the encrypted address book, or None
+    """
+    # The encrypted address book is created from the plain text one on the first run.
+    if encryption_key is not None and os.path.exists(ENCRYPTED_ADDRESS_BOOK_FILENAME):
+        filename = ENCRYPTED_ADDRESS_BOOK_FILENAME
+    else:
+        filename = ADDRESS_BOOK_FILENAME
+        encryption_key = None
+
+    if not os.path.exists(filename):
+        print(f"{filename} not found.")
+        raise SystemExit(1)
+
+    zip_codes_and_cities = read_zip_code_table(ZIPCODES_FILENAME)
+    problems = check_address_book(zip_codes_and_cities, filename, encryption_key=encryption_key)
+    print_address_book_report(problems)
+
+    if repair and problems:
+        repaired, rejected = repair_address_book(problems, filename, encryption_key)
+        print(f"{repaired} row(s) repaired, {rejected} row(s) moved to "
+              f"{filename}.rejected.")
+
+
+def tail_events_command(after_sequence, port):
+    """
+    Prints the changes to the address book after a sequence number, one JSON
+    row per event, and keeps printing new changes until interrupted.
+    :param after_sequence: sequence number of the last event already seen, int
+    :param port: port of the event server, or None to follow the event log, int
+    """
+    if port is not None:
+        events = tail_event_socket(port, after_sequence)
+    else:
+        events = tail_event_log(EVENT_LOG_FILENAME, after_sequence)
+
+    try:
+        for event in events:
+            print(json.dumps(event, ensure_ascii=False), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def encryption_key_command(keyfile, ask_passphrase):
+    """
+    Reads the key of the encrypted address book for the command line options, and
+    checks it against the encrypted address book before the GUI is started.
+    :param keyfile: name of the keyfile, or None, str
+    :param ask_passphrase: True to ask for a passphrase, bool
+    :return: EncryptionKey object, or None if the address book is not encrypted
+    """
+    if keyfile is None and not ask_passphrase:
+        return None
+
+    try:
+        if keyfile is not None:
+            encryption_key = EncryptionKey(keyfile=keyfile)
+        else:
+            passphrase = getpass.getpass("Passphrase: ")
+
+            # A new passphrase is asked twice, so that a typo does not lock the address book.
+            if not os.path.exists(ENCRYPTED_ADDRESS_BOOK_FILENAME) and \
+                    getpass.getpass("Repeat the passphrase: ") != passphrase:
+                print("The passphrases do not match.")
+                raise SystemExit(1)
+
+            encryption_key = EncryptionKey(passphrase=passphrase)
+
+        # Decrypting the first chunk tells whether the key is right.
+        if os.path.exists(ENCRYPTED_ADDRESS_BOOK_FILENAME):
+            next(read_encrypted_rows(ENCRYPTED_ADDRESS_BOOK_FILENAME, encryption_key), None)
+
+    except (RuntimeError, ValueError, OSError) as error:
+        print(f"Cannot open the encrypted address book: {error}")
+        raise SystemExit(1)
+
+    return encryption_key
+
+
+def benchmark_encryption_command(number_of_contacts):
+    """
+    Prints how much slower saving and loading are when the address book is encrypted.
+    :param number_of_contacts: number of contacts in the benchmark, int
+    """
+    if AESGCM is None:
+        print("The encryption benchmark needs the cryptography package.")
+        raise SystemExit(1)
+
+    timings = benchmark_encryption(number_of_contacts)
+
+    for operation in ("save", "load"):
+        plain = timings[("plain", operation)]
+        encrypted = timings[("encrypted", operation)]
+        print(f"{operation}: plain {plain:.3f} s, encrypted {encrypted:.3f} s "
+              f"({number_of_contacts / encrypted:.0f} contacts per second, "
+              f"{(encrypted / plain - 1) * 100:+.0f}% time)")
+
+
+def positive_integer(text):
+    """
+    Converts a command line argument to an integer of at least one.
+    :param text: the argument, str
+    :return: the argument, int
+    """
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return value
 
 
 def main():
-    ui = GUI()
+    parser = argparse.ArgumentParser(description="Address book")
+    parser.add_argument("--check", action="store_true",
+                        help="check the address book against the zip code table and exit")
+    parser.add_argument("--repair", action="store_true",
+                        help="check the address book and repair the problems found")
+    parser.add_argument("--lazy", action="store_true",
+                        help="show the window first and load the address book in the background")
+    parser.add_argument("--events-port", type=int,
+                        help="serve the changes to the address book on this local port")
+    parser.add_argument("--tail-events", type=int, metavar="SEQUENCE",
+                        help="print the changes to the address book after this sequence number")
+    parser.add_argument("--shards", type=positive_integer,
+                        help="divide the address book into this many files, loaded and saved in parallel")
+    parser.add_argument("--partition", choices=(PARTITION_BY_SURNAME, PARTITION_BY_ZIP_REGION),
+                        default=PARTITION_BY_SURNAME,
+                        help="divide a sharded address book by surname or by zip code region")
+    parser.add_argument("--keyfile",
+                        help="store the address book encrypted with the key in this file")
+    parser.add_argument("--passphrase", action="store_true",
+                        help="store the address book encrypted with a passphrase asked at start")
+    parser.add_argument("--create-keyfile", metavar="KEYFILE",
+                        help="create a keyfile with a random key and exit")
+    parser.add_argument("--benchmark-encryption", type=int, metavar="CONTACTS",
+                        help="measure the cost of encryption with this many contacts and exit")
+    arguments = parser.parse_args()
+
+    if arguments.create_keyfile is not None:
+        create_keyfile(arguments.create_keyfile)
+        return
+
+    if arguments.benchmark_encryption is not None:
+        benchmark_encryption_command(arguments.benchmark_encryption)
+        return
+
+    if arguments.keyfile is not None and arguments.passphrase:
+        parser.error("give either --keyfile or --passphrase, not both")
+
+    if arguments.shards is not None and (arguments.keyfile is not None or arguments.passphrase):
+        parser.error("a sharded address book cannot be encrypted")
+
+    if arguments.tail_events is not None:
+        tail_events_command(arguments.tail_events, arguments.events_port)
+        return
+
+    # The contacts of a sharded address book are only in the shard files.
+    if glob.glob(os.path.join(SHARD_DIRECTORY, "shard_*.txt")):
+        if arguments.check or arguments.repair:
+            parser.error(f"the address book is sharded in {SHARD_DIRECTORY}, "
+                         f"--check and --repair only work on {ADDRESS_BOOK_FILENAME}")
+        if arguments.shards is None:
+            parser.error(f"the address book is sharded in {SHARD_DIRECTORY}, run the program with --shards")
+
+    # Once the address book has been encrypted, the plain text file is gone.
+    if arguments.keyfile is None and not arguments.passphrase and \
+            os.path.exists(ENCRYPTED_ADDRESS_BOOK_FILENAME) and not os.path.exists(ADDRESS_BOOK_FILENAME):
+        parser.error(f"the address book is encrypted in {ENCRYPTED_ADDRESS_BOOK_FILENAME}, "
+                     f"give --keyfile or --passphrase")
+
+    encryption_key = encryption_key_command(arguments.keyfile, arguments.passphrase)
+
+    if arguments.check or arguments.repair:
+        check_address_book_command(arguments.repair, encryption_key)
+        return
+
+    ui = GUI(lazy_load=arguments.lazy, event_port=arguments.events_port,
+             shards=arguments.shards, partition=arguments.partition,
+             encryption_key=encryption_key)
     ui.start()
 
 
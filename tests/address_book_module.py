@@ -0,0 +1,31 @@
+"""
+Imports the address book program for the tests. The name of the program file
+contains spaces and a dot, so it cannot be imported with an import statement.
+"""
+
+import importlib.util
+import os
+import sys
+
+PROGRAM_FILENAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "13.10 project address book.py")
+
+
+def import_address_book():
+    """
+    Imports the address book program once and returns the module.
+    :return: module of the address book program
+    """
+    if "address_book" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("address_book", PROGRAM_FILENAME)
+        module = importlib.util.module_from_spec(spec)
+
+        # The module is registered first, so that the worker processes of the
+        # program can find its functions by name.
+        sys.modules["address_book"] = module
+        spec.loader.exec_module(module)
+
+    return sys.modules["address_book"]
+
+
+address_book = import_address_book()
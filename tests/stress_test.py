@@ -0,0 +1,411 @@
+"""
+Stress test of the address book GUI. Random sequences of operations are run
+through the button callbacks of the GUI, and after every operation the address
+book is checked to be consistent.
+
+Usage: python tests/stress_test.py OPERATIONS [--seed SEED] [--headless] [--shards N]
+--seed repeats a run, and --headless runs it without a display (otherwise run it
+under e.g. xvfb-run).
+"""
+
+from collections import Counter
+import argparse
+import glob
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from address_book_module import address_book, PROGRAM_FILENAME
+
+ZIPCODES_PATH = os.path.join(os.path.dirname(PROGRAM_FILENAME), address_book.ZIPCODES_FILENAME)
+
+
+class HeadlessWidget:
+    """
+    This class stands in for the tkinter widgets when the GUI is stress tested
+    without a display. Entry fields keep their text, everything else does nothing.
+    """
+
+    def __init__(self, master=None, **options):
+        self.options = options
+        self.text = ""
+        self.__after_id = 0
+
+    def __getattr__(self, name):
+        # Layout and window methods like grid, pack and title are ignored.
+        return lambda *args, **kwargs: None
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def get(self):
+        return self.text
+
+    def cget(self, option):
+        return self.options.get(option, "")
+
+    def insert(self, index, text):
+        if index == 'end':
+            index = len(self.text)
+        self.text = self.text[:index] + text + self.text[index:]
+
+    def delete(self, first, last=None):
+        self.text = ""
+
+    def after(self, delay, callback, *args):
+        # Scheduled callbacks are never run, the stress test flushes the events itself.
+        self.__after_id += 1
+        return f"after#{self.__after_id}"
+
+
+def use_headless_widgets():
+    """
+    Replaces the tkinter widgets used by the GUI with HeadlessWidget objects.
+    """
+    for name in ("Tk", "Toplevel", "Frame", "Label", "Button", "Entry", "Listbox"):
+        setattr(address_book, name, HeadlessWidget)
+
+
+class AddressBookStressTest:
+    """
+    This class drives the GUI's button callbacks with random sequences of operations
+    and checks after every operation that the address book is still consistent:
+    the saved file has the same contacts as the address book dictionary, no contact
+    has been lost or added by accident, and the pages match the number of contacts.
+    The test runs in a temporary directory, so the real address book is not touched.
+    """
+
+    # Relative weights of the operations.
+    OPERATIONS = {"add": 6, "add invalid": 1, "add existing": 1, "search": 4, "delete": 3,
+                  "edit": 3, "edit rename": 2, "edit abandoned": 1, "pages": 2}
+
+    def __init__(self, seed=None, target_size=200, check_every=1, shards=None):
+        """
+        :param seed: seed of the random operations, the same seed repeats the same test, int
+        :param target_size: number of contacts the address book grows to and stays around, int
+        :param check_every: check the invariants after every this many operations, int
+        :param shards: if given, the address book is sharded into this many files, int
+        """
+        self.shards = shards
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.random = random.Random(self.seed)
+        self.target_size = target_size
+        self.check_every = check_every
+
+        # The contacts the address book should have, as key -> row.
+        self.expected = {}
+        self.operation_counts = Counter()
+
+        self.gui = None
+        self.zip_codes_and_cities = {}
+        self.zip_codes = []
+
+    def run(self, number_of_operations):
+        """
+        Runs the stress test.
+        :param number_of_operations: number of random operations, int
+        :return: number of operations per second, float
+        :raises AssertionError: if an invariant does not hold after an operation
+        """
+        working_directory = os.getcwd()
+        temporary_directory = tempfile.mkdtemp()
+        shutil.copy(ZIPCODES_PATH, temporary_directory)
+
+        try:
+            os.chdir(temporary_directory)
+            open(address_book.ADDRESS_BOOK_FILENAME, mode="w").close()
+
+            self.gui = address_book.GUI(shards=self.shards)
+            self.gui.load_address_book()
+            self.zip_codes_and_cities = address_book.read_zip_code_table(address_book.ZIPCODES_FILENAME)
+            self.zip_codes = sorted(self.zip_codes_and_cities)
+
+            operations = list(self.OPERATIONS)
+            weights = list(self.OPERATIONS.values())
+
+            start_time = time.perf_counter()
+
+            for operation_number in range(1, number_of_operations + 1):
+                operation = self.random.choices(operations, weights)[0]
+                self.operation_counts[operation] += 1
+                getattr(self, "operation_" + operation.replace(" ", "_"))()
+
+                if operation_number % self.check_every == 0:
+                    try:
+                        self.check_invariants()
+                    except AssertionError as error:
+                        raise AssertionError(f"operation {operation_number} ({operation}), "
+                                             f"seed {self.seed}: {error}") from None
+
+            elapsed_time = time.perf_counter() - start_time
+
+            self.gui.stop()
+        finally:
+            os.chdir(working_directory)
+            shutil.rmtree(temporary_directory)
+
+        return number_of_operations / elapsed_time if elapsed_time > 0 else float("inf")
+
+    # -- Helpers --
+
+    def random_name(self):
+        """
+        :return: a random name without spaces, str
+        """
+        syllables = ["ka", "le", "mi", "no", "pu", "sa", "ti", "vo", "hä", "jö"]
+        return "".join(self.random.choice(syllables) for _ in range(self.random.randint(2, 4))).capitalize()
+
+    def random_contact_fields(self):
+        """
+        :return: random valid form data for a contact, dict
+        """
+        return {"first_name": self.random_name(),
+                "last_name": self.random_name(),
+                "address": f"{self.random_name()}katu {self.random.randint(1, 99)}",
+                "zip_code": self.random.choice(self.zip_codes)}
+
+    def expected_row(self, fields):
+        """
+        :return: the row a contact with the form data should have in the address book file, str
+        """
+        city = self.zip_codes_and_cities[fields["zip_code"]]
+        return f"{fields['first_name']};{fields['last_name']};{fields['address']};{fields['zip_code']};{city}\n"
+
+    def random_existing_contact(self):
+        """
+        :return: a random contact in the address book, or None if it is empty
+        """
+        if not self.expected:
+            return None
+        return address_book.row_to_contact(self.expected[self.random.choice(list(self.expected))])
+
+    def fill(self, entries, fields):
+        """
+        Types the form data into the entry fields of a page.
+        :param entries: the entry fields in the order of first name, last name, address, zip code
+        :param fields: form data, dict
+        """
+        for entry, name in zip(entries, ("first_name", "last_name", "address", "zip_code")):
+            entry.delete(0, 'end')
+            entry.insert(0, fields[name])
+
+    def search_for(self, first_name, last_name):
+        """
+        Types a name into the search field.
+        """
+        search_entry, = self.gui.form_entries("search")
+        search_entry.delete(0, 'end')
+        search_entry.insert(0, f"{first_name} {last_name}")
+
+    # -- Operations --
+
+    def operation_add(self):
+        # Once the address book is big enough, contacts are deleted as often as added.
+        if len(self.expected) >= self.target_size:
+            self.operation_delete()
+            return
+
+        fields = self.random_contact_fields()
+        key = address_book.contact_key(fields["first_name"], fields["last_name"])
+
+        self.gui.add_to_address_book_page()
+        self.fill(self.gui.form_entries("add"), fields)
+        self.gui.add_to_address_book()
+
+        if key not in self.expected:
+            self.expected[key] = self.expected_row(fields)
+
+    def operation_add_invalid(self):
+        fields = self.random_contact_fields()
+        broken_field = self.random.choice(list(fields))
+        fields[broken_field] = self.random.choice(["", "semi;colon", "new\nline"])
+
+        # 99998 is not a zip code in Finland.
+        if broken_field == "zip_code" and self.random.random() < 0.5:
+            fields[broken_field] = "99998"
+
+        self.gui.add_to_address_book_page()
+        self.fill(self.gui.form_entries("add"), fields)
+        self.gui.add_to_address_book()
+
+    def operation_add_existing(self):
+        contact = self.random_existing_contact()
+        if contact is None:
+            return
+
+        fields = self.random_contact_fields()
+        fields["first_name"] = contact.first_name
+        fields["last_name"] = contact.last_name
+
+        self.gui.add_to_address_book_page()
+        self.fill(self.gui.form_entries("add"), fields)
+        self.gui.add_to_address_book()
+
+    def operation_search(self):
+        contact = self.random_existing_contact()
+        if contact is None or self.random.random() < 0.2:
+            self.search_for(self.random_name(), self.random_name())
+        else:
+            self.search_for(contact.first_name, contact.last_name)
+
+        self.gui.search_page()
+        self.gui.search()
+
+    def operation_delete(self):
+        contact = self.random_existing_contact()
+        if contact is None:
+            return
+
+        self.gui.search_page()
+        self.search_for(contact.first_name, contact.last_name)
+        self.gui.search()
+        self.gui.delete()
+
+        del self.expected[address_book.contact_key(contact.first_name, contact.last_name)]
+
+    def start_edit(self):
+        """
+        Searches a random contact and presses the edit button.
+        :return: the contact being edited, or None if the address book is empty
+        """
+        contact = self.random_existing_contact()
+        if contact is None:
+            return None
+
+        self.gui.search_page()
+        self.search_for(contact.first_name, contact.last_name)
+        self.gui.search()
+        self.gui.edit()
+        return contact
+
+    def operation_edit(self):
+        contact = self.start_edit()
+        if contact is None:
+            return
+
+        fields = self.random_contact_fields()
+        fields["first_name"] = contact.first_name
+        fields["last_name"] = contact.last_name
+
+        self.fill(self.gui.form_entries("edit"), fields)
+        self.gui.edit_address()
+
+        self.expected[address_book.contact_key(contact.first_name, contact.last_name)] = self.expected_row(fields)
+
+    def operation_edit_rename(self):
+        contact = self.start_edit()
+        if contact is None:
+            return
+
+        # Half of the renames are to a name which is already taken and must be refused.
+        other_contact = self.random_existing_contact()
+        fields = self.random_contact_fields()
+        if self.random.random() < 0.5:
+            fields["first_name"] = other_contact.first_name
+            fields["last_name"] = other_contact.last_name
+
+        self.fill(self.gui.form_entries("edit"), fields)
+        self.gui.edit_address()
+
+        old_key = address_book.contact_key(contact.first_name, contact.last_name)
+        key = address_book.contact_key(fields["first_name"], fields["last_name"])
+        if key == old_key or key not in self.expected:
+            del self.expected[old_key]
+            self.expected[key] = self.expected_row(fields)
+
+    def operation_edit_abandoned(self):
+        # The user opens the edit page but goes to another page without saving.
+        if self.start_edit() is not None:
+            self.gui.address_book_page()
+
+    def operation_pages(self):
+        self.gui.address_book_page()
+        for _ in range(self.random.randint(1, 5)):
+            if self.random.random() < 0.5:
+                self.gui.front_button()
+            else:
+                self.gui.back_button()
+
+    # -- Invariants --
+
+    def check_invariants(self):
+        """
+        :raises AssertionError: if the address book is not consistent
+        """
+        contacts = self.gui.contacts()
+
+        # No contact is lost or added by accident.
+        actual = {key: address_book.contact_to_row(contact) for key, contact in contacts.items()}
+        assert actual == self.expected, \
+            f"address book differs from the expected contacts: " \
+            f"missing {sorted(self.expected.keys() - actual.keys())}, " \
+            f"extra {sorted(actual.keys() - self.expected.keys())}"
+
+        # The saved files have exactly the contacts of the address book dictionary.
+        if self.shards is not None:
+            filenames = glob.glob(os.path.join(address_book.SHARD_DIRECTORY, "shard_*.txt"))
+        else:
+            filenames = [address_book.ADDRESS_BOOK_FILENAME]
+
+        rows = []
+        for filename in filenames:
+            with open(filename, mode="r", encoding="utf-8") as file:
+                rows.extend(file.readlines())
+        assert sorted(rows) == sorted(actual.values()), "saved file differs from the address book"
+
+        # The statistics count every contact once.
+        assert self.gui.statistics.number_of_contacts == len(contacts), \
+            "statistics count differs from the address book"
+
+        # The pages hold every contact and the current page is one of them.
+        self.gui.address_book_page()
+        number_of_pages = -(-len(contacts) // self.gui.page_size)
+        assert self.gui.number_of_pages == number_of_pages, \
+            f"{self.gui.number_of_pages} pages for {len(contacts)} contacts"
+        assert 1 <= self.gui.current_page() <= max(1, number_of_pages), \
+            f"current page {self.gui.current_page()} of {number_of_pages}"
+
+        # The cached order of the pages is not stale.
+        assert list(self.gui.sorted_keys()) == sorted(contacts), "cached pages are stale"
+
+
+def stress_test_command(number_of_operations, seed, headless, shards):
+    """
+    Runs the stress test from the command line and prints the throughput.
+    :param number_of_operations: number of random operations, int
+    :param seed: seed of the random operations, or None for a random seed, int
+    :param headless: True to run without a display, bool
+    :param shards: number of shards of the address book, or None, int
+    """
+    if headless:
+        use_headless_widgets()
+
+    stress_test = AddressBookStressTest(seed, shards=shards)
+    try:
+        operations_per_second = stress_test.run(number_of_operations)
+    except AssertionError as error:
+        print(f"FAILED: {error}")
+        raise SystemExit(1)
+
+    for operation, count in sorted(stress_test.operation_counts.items()):
+        print(f"{operation}: {count}")
+    print(f"{number_of_operations} operations with seed {stress_test.seed}, "
+          f"{operations_per_second:.0f} operations per second.")
+    print(f"Page and search cache hit rate: {stress_test.gui.cache.hit_rate():.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test of the address book GUI")
+    parser.add_argument("operations", type=int, help="number of random operations")
+    parser.add_argument("--seed", type=int, help="seed of the stress test")
+    parser.add_argument("--headless", action="store_true", help="run the stress test without a display")
+    parser.add_argument("--shards", type=int, help="divide the address book into this many files")
+    arguments = parser.parse_args()
+
+    stress_test_command(arguments.operations, arguments.seed, arguments.headless, arguments.shards)
+
+
+if __name__ == "__main__":
+    main()
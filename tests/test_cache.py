@@ -0,0 +1,48 @@
+"""
+Tests of the cache of page slices and search results.
+"""
+
+import unittest
+
+from address_book_module import address_book
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def test_results_are_cached_until_invalidated(self):
+        cache = address_book.ResultCache()
+        computed = []
+
+        def compute():
+            computed.append(1)
+            return len(computed)
+
+        self.assertEqual(cache.get("page", compute), 1)
+        self.assertEqual(cache.get("page", compute), 1)
+
+        cache.invalidate()
+        self.assertEqual(cache.get("page", compute), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_invalidate_frees_the_results(self):
+        cache = address_book.ResultCache()
+        for number in range(10):
+            cache.get(number, list)
+        self.assertEqual(len(cache), 10)
+
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_result_is_evicted(self):
+        cache = address_book.ResultCache(max_size=2)
+        cache.get("a", lambda: "a")
+        cache.get("b", lambda: "b")
+        cache.get("a", lambda: "a")
+        cache.get("c", lambda: "c")
+
+        self.assertEqual(cache.get("a", lambda: "new a"), "a")
+        self.assertEqual(cache.get("b", lambda: "new b"), "new b")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests of checking and repairing the address book file.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from address_book_module import address_book
+from stress_test import ZIPCODES_PATH, use_headless_widgets
+
+ZIP_CODES_AND_CITIES = {"00100": "Helsinki", "33720": "Tampere"}
+
+
+class CheckAddressBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "address_book.txt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, rows):
+        with open(self.filename, mode="w", encoding="utf-8") as file:
+            file.write("".join(rows))
+
+    def read(self, filename):
+        with open(filename, mode="r", encoding="utf-8") as file:
+            return file.readlines()
+
+    def check_and_repair(self):
+        """
+        :return: the problems found, and the numbers of repaired and rejected rows
+        """
+        problems = address_book.check_address_book(ZIP_CODES_AND_CITIES, self.filename, workers=1)
+        return problems, address_book.repair_address_book(problems, self.filename)
+
+    def test_problems_of_rows(self):
+        rows = ["Anna;Ala;Katu 1;33720;Tampere\n",
+                "not a contact\n",
+                "Bob;Bee;Katu 2;99999;Nowhere\n",
+                "Cecilia;Cee;Katu 3;00100;Espoo\n"]
+
+        problems = address_book.check_address_book_rows(rows, 10, ZIP_CODES_AND_CITIES)
+
+        self.assertEqual([(line_number, problem) for line_number, problem, _, _ in problems],
+                         [(11, address_book.PROBLEM_MALFORMED),
+                          (12, address_book.PROBLEM_UNKNOWN_ZIP),
+                          (13, address_book.PROBLEM_CITY_MISMATCH)])
+        self.assertEqual(problems[2][3], "Cecilia;Cee;Katu 3;00100;Helsinki\n")
+
+    def test_byte_order_mark_and_wrong_city_are_repaired_together(self):
+        self.write(["\ufeffAnna;Ala;Katu 1;33720;Helsinki\n", "Bob;Bee;Katu 2;00100;Helsinki\n"])
+
+        problems, (repaired, rejected) = self.check_and_repair()
+
+        self.assertEqual([problem for _, problem, _, _ in problems],
+                         [address_book.PROBLEM_BYTE_ORDER_MARK, address_book.PROBLEM_CITY_MISMATCH])
+        self.assertEqual((repaired, rejected), (1, 0))
+        self.assertEqual(self.read(self.filename),
+                         ["Anna;Ala;Katu 1;33720;Tampere\n", "Bob;Bee;Katu 2;00100;Helsinki\n"])
+
+    def test_unknown_zip_code_is_rejected(self):
+        self.write(["Anna;Ala;Katu 1;33720;Tampere\n", "Bob;Bee;Katu 2;99999;Nowhere"])
+
+        _, (repaired, rejected) = self.check_and_repair()
+
+        self.assertEqual((repaired, rejected), (0, 1))
+        self.assertEqual(self.read(self.filename), ["Anna;Ala;Katu 1;33720;Tampere\n"])
+        self.assertEqual(self.read(self.filename + ".rejected"), ["Bob;Bee;Katu 2;99999;Nowhere\n"])
+
+    def test_rejected_rows_are_appended(self):
+        self.write(["not a contact\n", "Anna;Ala;Katu 1;33720;Tampere\n"])
+        self.check_and_repair()
+
+        self.write(["Anna;Ala;Katu 1;33720;Tampere\n", "Bob;Bee;Katu 2;99999;Nowhere\n"])
+        self.check_and_repair()
+
+        self.assertEqual(self.read(self.filename + ".rejected"),
+                         ["not a contact\n", "Bob;Bee;Katu 2;99999;Nowhere\n"])
+        self.assertEqual(self.read(self.filename), ["Anna;Ala;Katu 1;33720;Tampere\n"])
+
+    def test_clean_address_book_is_not_changed(self):
+        rows = ["Anna;Ala;Katu 1;33720;Tampere\n", "Bob;Bee;Katu 2;00100;Helsinki\n"]
+        self.write(rows)
+
+        problems, (repaired, rejected) = self.check_and_repair()
+
+        self.assertEqual((problems, repaired, rejected), ([], 0, 0))
+        self.assertEqual(self.read(self.filename), rows)
+
+
+class MalformedRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        use_headless_widgets()
+        self.directory = tempfile.TemporaryDirectory()
+        shutil.copy(ZIPCODES_PATH, self.directory.name)
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def test_malformed_rows_are_saved_unchanged(self):
+        malformed_rows = ["not a contact\n", "too;many;fields;in;this;row\n", "no newline"]
+        with open(address_book.ADDRESS_BOOK_FILENAME, mode="w", encoding="utf-8") as file:
+            file.write("Anna;Ala;Katu 1;33720;Tampere\n")
+            file.write("".join(malformed_rows))
+
+        gui = address_book.GUI()
+        gui.load_address_book()
+        gui.add_contact(address_book.contact_key("Bob", "Bee"),
+                        address_book.ContactCard("Bob", "Bee", "Katu 2", "00100", "Helsinki"))
+        gui.save_address_book()
+        gui.stop()
+
+        with open(address_book.ADDRESS_BOOK_FILENAME, mode="r", encoding="utf-8") as file:
+            self.assertEqual(file.readlines(), ["Anna;Ala;Katu 1;33720;Tampere\n",
+                                                "Bob;Bee;Katu 2;00100;Helsinki\n",
+                                                "not a contact\n", "too;many;fields;in;this;row\n",
+                                                "no newline\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
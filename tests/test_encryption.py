@@ -0,0 +1,179 @@
+"""
+Tests of the encrypted storage of the address book.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from address_book_module import address_book
+
+
+@unittest.skipIf(address_book.AESGCM is None, "the cryptography package is not installed")
+class EncryptedStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "address_book.enc")
+        self.keyfile = os.path.join(self.directory.name, "address_book.key")
+        address_book.create_keyfile(self.keyfile)
+        self.encryption_key = address_book.EncryptionKey(keyfile=self.keyfile)
+
+        # Enough rows for several chunks, the last one without a newline.
+        self.rows = [f"First{number};Last{number};Street {number};33720;Tampere\n" for number in range(5000)]
+        self.rows.append("no newline at the end")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, encryption_key=None):
+        file = address_book.EncryptedWriter(self.filename, encryption_key or self.encryption_key)
+        for row in self.rows:
+            file.write(row)
+        file.close()
+
+    def read(self, encryption_key=None):
+        return list(address_book.read_encrypted_rows(self.filename, encryption_key or self.encryption_key))
+
+    def test_round_trip(self):
+        self.write()
+
+        self.assertGreater(os.path.getsize(self.filename), 2 * address_book.ENCRYPTION_CHUNK_SIZE)
+        self.assertEqual(self.read(), self.rows)
+
+        with open(self.filename, mode="rb") as file:
+            self.assertNotIn(b"Tampere", file.read())
+
+    def test_passphrase_round_trip(self):
+        self.write(address_book.EncryptionKey(passphrase="correct horse"))
+
+        self.assertEqual(self.read(address_book.EncryptionKey(passphrase="correct horse")), self.rows)
+        with self.assertRaisesRegex(ValueError, "wrong key"):
+            self.read(address_book.EncryptionKey(passphrase="wrong horse"))
+
+    def test_wrong_keyfile(self):
+        self.write()
+
+        other_keyfile = os.path.join(self.directory.name, "other.key")
+        address_book.create_keyfile(other_keyfile)
+
+        with self.assertRaisesRegex(ValueError, "wrong key"):
+            self.read(address_book.EncryptionKey(keyfile=other_keyfile))
+
+    def test_tampering_is_rejected(self):
+        self.write()
+
+        with open(self.filename, mode="r+b") as file:
+            file.seek(address_book.ENCRYPTION_CHUNK_SIZE)
+            byte = file.read(1)
+            file.seek(-1, os.SEEK_CUR)
+            file.write(bytes([byte[0] ^ 1]))
+
+        with self.assertRaisesRegex(ValueError, "damaged"):
+            self.read()
+
+    def test_truncation_is_rejected(self):
+        self.write()
+
+        # Cutting the file inside a chunk and right after a whole chunk are both noticed.
+        with open(self.filename, mode="rb") as file:
+            data = file.read()
+        header_size = len(address_book.ENCRYPTION_MAGIC) + address_book.ENCRYPTION_SALT_SIZE
+        first_chunk_size = (address_book.ENCRYPTION_CHUNK_HEADER.size + address_book.ENCRYPTION_NONCE_SIZE +
+                            address_book.ENCRYPTION_CHUNK_SIZE + 16)
+
+        for size in (len(data) - 10, header_size + first_chunk_size):
+            with open(self.filename, mode="wb") as file:
+                file.write(data[:size])
+
+            with self.assertRaisesRegex(ValueError, "cut off"):
+                self.read()
+
+    def test_reordered_chunks_are_rejected(self):
+        self.write()
+
+        with open(self.filename, mode="rb") as file:
+            data = file.read()
+        header_size = len(address_book.ENCRYPTION_MAGIC) + address_book.ENCRYPTION_SALT_SIZE
+        chunk_size = (address_book.ENCRYPTION_CHUNK_HEADER.size + address_book.ENCRYPTION_NONCE_SIZE +
+                      address_book.ENCRYPTION_CHUNK_SIZE + 16)
+        first_chunk = data[header_size:header_size + chunk_size]
+        second_chunk = data[header_size + chunk_size:header_size + 2 * chunk_size]
+
+        with open(self.filename, mode="wb") as file:
+            file.write(data[:header_size] + second_chunk + first_chunk + data[header_size + 2 * chunk_size:])
+
+        with self.assertRaisesRegex(ValueError, "damaged"):
+            self.read()
+
+    def test_check_and_repair_encrypted_address_book(self):
+        self.rows = ["Anna;Ala;Katu 1;33720;Helsinki\n", "not a contact\n", "Bob;Bee;Katu 2;33720;Tampere\n"]
+        self.write()
+
+        zip_codes_and_cities = {"33720": "Tampere"}
+        problems = address_book.check_address_book(zip_codes_and_cities, self.filename, workers=1,
+                                                    encryption_key=self.encryption_key)
+        self.assertEqual([(line_number, problem) for line_number, problem, _, _ in problems],
+                         [(1, address_book.PROBLEM_CITY_MISMATCH), (2, address_book.PROBLEM_MALFORMED)])
+
+        self.assertEqual(address_book.repair_address_book(problems, self.filename, self.encryption_key), (1, 1))
+        self.assertEqual(self.read(), ["Anna;Ala;Katu 1;33720;Tampere\n", "Bob;Bee;Katu 2;33720;Tampere\n"])
+        self.assertEqual(list(address_book.read_encrypted_rows(self.filename + ".rejected", self.encryption_key)),
+                         ["not a contact\n"])
+
+
+class EncryptedEventsTest(unittest.TestCase):
+
+    def test_stream_without_event_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            working_directory = os.getcwd()
+            os.chdir(directory)
+            try:
+                stream = address_book.MutationEventStream(filename=None, batch_size=1)
+                events = []
+                stream.subscribe(events.extend, after_sequence=0)
+
+                contact = address_book.ContactCard("Anna", "Ala", "Katu 1", "33720", "Tampere")
+                stream.publish(address_book.EVENT_ADD, "anna ala", None, contact)
+
+                self.assertEqual([event["sequence"] for event in events], [1])
+                self.assertEqual(os.listdir(directory), [])
+            finally:
+                os.chdir(working_directory)
+
+
+@unittest.skipIf(address_book.AESGCM is None, "the cryptography package is not installed")
+class PassphraseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def test_new_passphrase_is_confirmed(self):
+        with mock.patch.object(address_book.getpass, "getpass", side_effect=["secret", "secret"]) as getpass:
+            self.assertIsNotNone(address_book.encryption_key_command(None, True))
+        self.assertEqual(getpass.call_count, 2)
+
+        with mock.patch.object(address_book.getpass, "getpass", side_effect=["secret", "secert"]), \
+                mock.patch("builtins.print"):
+            with self.assertRaises(SystemExit):
+                address_book.encryption_key_command(None, True)
+
+    def test_existing_passphrase_is_asked_once(self):
+        file = address_book.EncryptedWriter(address_book.ENCRYPTED_ADDRESS_BOOK_FILENAME,
+                                            address_book.EncryptionKey(passphrase="secret"))
+        file.close()
+
+        with mock.patch.object(address_book.getpass, "getpass", side_effect=["secret"]) as getpass:
+            self.assertIsNotNone(address_book.encryption_key_command(None, True))
+        self.assertEqual(getpass.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Tests of the mutation event stream and its event log.
+"""
+
+import os
+import tempfile
+import unittest
+
+from address_book_module import address_book
+
+
+def contact(number):
+    """
+    :param number: number which makes the contact unique, int
+    :return: ContactCard object
+    """
+    return address_book.ContactCard(f"First{number}", f"Last{number}", f"Street {number}", "00100", "Helsinki")
+
+
+class MutationEventStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "events.log")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def publish(self, stream, count):
+        """
+        Publishes add events of new contacts.
+        :param stream: MutationEventStream object
+        :param count: number of events, int
+        """
+        for number in range(count):
+            stream.publish(address_book.EVENT_ADD, f"key{number}", None, contact(number))
+
+    def test_events_are_delivered_in_batches(self):
+        stream = address_book.MutationEventStream(self.filename, batch_size=10)
+        batches = []
+        stream.subscribe(batches.append)
+
+        self.publish(stream, 25)
+        self.assertEqual([len(batch) for batch in batches], [10, 10])
+
+        stream.flush()
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        self.assertEqual([event["sequence"] for batch in batches for event in batch], list(range(1, 26)))
+
+    def test_sequence_numbers_continue_from_the_log(self):
+        stream = address_book.MutationEventStream(self.filename, batch_size=10)
+        self.publish(stream, 15)
+        stream.flush()
+
+        stream = address_book.MutationEventStream(self.filename, batch_size=10)
+        self.assertEqual(stream.sequence_number, 15)
+
+        self.publish(stream, 1)
+        stream.flush()
+        self.assertEqual([event["sequence"] for event in address_book.read_events(self.filename)],
+                         list(range(1, 17)))
+
+    def test_subscriber_resumes_after_sequence_number(self):
+        stream = address_book.MutationEventStream(self.filename, batch_size=10)
+        self.publish(stream, 37)
+
+        # Events 31-37 are still waiting in the batch when the subscriber resumes.
+        events = []
+        stream.subscribe(lambda batch: events.extend(batch), after_sequence=12)
+        self.publish(stream, 5)
+        stream.flush()
+
+        self.assertEqual([event["sequence"] for event in events], list(range(13, 43)))
+
+    def test_find_event_offset(self):
+        stream = address_book.MutationEventStream(self.filename, batch_size=7)
+        self.publish(stream, 200)
+        stream.flush()
+
+        with open(self.filename, mode="rb") as file:
+            rows = file.readlines()
+            offsets = [0]
+            for row in rows:
+                offsets.append(offsets[-1] + len(row))
+
+            # The offset of the first event after every sequence number is the start of its row.
+            for sequence_number in range(0, 201):
+                self.assertEqual(address_book._find_event_offset(file, sequence_number), offsets[sequence_number])
+
+            self.assertEqual(address_book._find_event_offset(file, 1000), offsets[-1])
+
+    def test_row_being_written_is_not_read(self):
+        stream = address_book.MutationEventStream(self.filename, batch_size=10)
+        self.publish(stream, 10)
+
+        with open(self.filename, mode="a", encoding="utf-8") as file:
+            file.write('{"sequence": 11, "kind"')
+
+        self.assertEqual([event["sequence"] for event in address_book.read_events(self.filename, 5)],
+                         list(range(6, 11)))
+        self.assertEqual(list(address_book.read_events(self.filename, 10)), [])
+
+    def test_missing_log_has_no_events(self):
+        self.assertEqual(list(address_book.read_events(self.filename)), [])
+        self.assertEqual(address_book.MutationEventStream(self.filename).sequence_number, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Tests of loading a large address book lazily.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from address_book_module import address_book
+from stress_test import ZIPCODES_PATH, use_headless_widgets
+
+NUMBER_OF_CONTACTS = 12000
+
+
+class LazyLoadingTest(unittest.TestCase):
+
+    def setUp(self):
+        use_headless_widgets()
+        self.directory = tempfile.TemporaryDirectory()
+        shutil.copy(ZIPCODES_PATH, self.directory.name)
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+        zip_codes_and_cities = address_book.read_zip_code_table(address_book.ZIPCODES_FILENAME)
+        self.zip_codes = sorted(zip_codes_and_cities)
+
+        # The contacts are not in alphabetical order, so the first page changes while loading.
+        self.rows = []
+        for number in range(NUMBER_OF_CONTACTS):
+            zip_code = self.zip_codes[number % len(self.zip_codes)]
+            self.rows.append(f"First{number};Last{NUMBER_OF_CONTACTS - number:05d};Street {number};"
+                             f"{zip_code};{zip_codes_and_cities[zip_code]}\n")
+        self.rows.insert(5, "not a contact\n")
+        self.rows.insert(7, self.rows[0])
+
+        with open(address_book.ADDRESS_BOOK_FILENAME, mode="w", encoding="utf-8") as file:
+            file.write("".join(self.rows))
+
+        self.gui = address_book.GUI(lazy_load=True)
+        self.gui.start_lazy_load()
+
+    def tearDown(self):
+        self.gui.finish_loading()
+        self.gui.stop()
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def search(self, name):
+        """
+        Searches for a name on the search page.
+        :return: True if the contact was found, bool
+        """
+        search_entry, = self.gui.form_entries("search")
+        search_entry.delete(0, 'end')
+        search_entry.insert(0, name)
+
+        self.gui.search_page()
+        self.gui.search()
+        return address_book.contact_key(*name.split(" ")) in self.gui.contacts()
+
+    def check_derived_data(self):
+        """
+        Checks that the statistics, the palette and the nearby search know every loaded contact.
+        """
+        contacts = self.gui.contacts()
+
+        statistics = address_book.AddressBookStatistics()
+        statistics.recompute(contacts.values())
+        self.assertEqual(self.gui.statistics.number_of_contacts, len(contacts))
+        self.assertEqual(self.gui.statistics.cities, statistics.cities)
+        self.assertEqual(self.gui.statistics.regions, statistics.regions)
+
+        search_index = address_book.ContactSearchIndex()
+        search_index.rebuild(contacts)
+        for prefix in ("first1", "last0", "h", "first11999"):
+            self.assertEqual(self.gui.search_index.search(prefix, 50), search_index.search(prefix, 50))
+
+    def test_first_chunk_is_loaded_before_the_window(self):
+        self.assertTrue(self.gui.loading)
+        self.assertEqual(len(self.gui.contacts()), address_book.LAZY_LOAD_FIRST_CHUNK - 2)
+        self.check_derived_data()
+
+    def test_chunks_update_the_derived_data(self):
+        self.gui.load_next_chunk()
+
+        self.assertTrue(self.gui.loading)
+        self.assertEqual(len(self.gui.contacts()),
+                         address_book.LAZY_LOAD_FIRST_CHUNK + address_book.LAZY_LOAD_CHUNK_SIZE - 2)
+        self.check_derived_data()
+
+        while self.gui.loading:
+            self.gui.load_next_chunk()
+
+        self.assertEqual(len(self.gui.contacts()), NUMBER_OF_CONTACTS)
+        self.check_derived_data()
+
+    def test_search_loads_until_the_contact(self):
+        self.assertTrue(self.search(f"First8000 Last{NUMBER_OF_CONTACTS - 8000:05d}"))
+
+        # The search stops at the contact, and the next search continues from there.
+        self.assertTrue(self.gui.loading)
+        self.assertEqual(len(self.gui.contacts()), 8001)
+        self.check_derived_data()
+
+        self.assertTrue(self.search(f"First9000 Last{NUMBER_OF_CONTACTS - 9000:05d}"))
+        self.assertEqual(len(self.gui.contacts()), 9001)
+
+    def test_search_for_missing_contact_loads_everything(self):
+        self.assertFalse(self.search("No Body"))
+        self.assertFalse(self.gui.loading)
+        self.assertEqual(len(self.gui.contacts()), NUMBER_OF_CONTACTS)
+
+    def test_change_loads_everything_before_saving(self):
+        entries = self.gui.form_entries("add")
+        for entry, text in zip(entries, ("New", "Contact", "Street 1", self.zip_codes[0])):
+            entry.insert(0, text)
+
+        self.gui.add_to_address_book_page()
+        self.gui.add_to_address_book()
+
+        self.assertFalse(self.gui.loading)
+        self.assertEqual(len(self.gui.contacts()), NUMBER_OF_CONTACTS + 1)
+
+        # Every contact and the malformed row are saved, and the duplicate is dropped.
+        with open(address_book.ADDRESS_BOOK_FILENAME, mode="r", encoding="utf-8") as file:
+            saved_rows = file.readlines()
+        self.assertEqual(len(saved_rows), NUMBER_OF_CONTACTS + 2)
+        self.assertIn("not a contact\n", saved_rows)
+
+    def test_pages_are_marked_partial_while_loading(self):
+        self.gui.address_book_page()
+        self.assertEqual(self.gui.page_label(), "1 (partial)")
+
+        while self.gui.loading:
+            self.gui.load_next_chunk()
+
+        # The page shown is drawn again with every contact once the loading finishes.
+        self.assertEqual(self.gui.page_label(), "1")
+        first_key = self.gui.sorted_keys()[0]
+        self.assertEqual(first_key, address_book.contact_key(f"First{NUMBER_OF_CONTACTS - 1}", "Last00001"))
+
+
+if __name__ == "__main__":
+    unittest.main()
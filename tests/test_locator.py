@@ -0,0 +1,139 @@
+"""
+Tests of finding the contacts near a zip code.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from address_book_module import address_book
+from stress_test import ZIPCODES_PATH, use_headless_widgets
+
+
+def random_coordinates(generator, number_of_zip_codes):
+    """
+    :return: random coordinates of zip codes around Finland, dict of zip code -> (latitude, longitude)
+    """
+    return {f"{number:05d}": (generator.uniform(59.8, 70.0), generator.uniform(20.5, 31.5))
+            for number in range(number_of_zip_codes)}
+
+
+class ContactLocatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(1)
+        self.coordinates = random_coordinates(self.random, 300)
+        self.locator = address_book.ContactLocator(self.coordinates)
+
+        # Some contacts have a zip code without coordinates.
+        self.contacts = {}
+        zip_codes = list(self.coordinates) + ["99999"]
+        for number in range(1000):
+            zip_code = self.random.choice(zip_codes)
+            self.contacts[f"key{number:04d}"] = address_book.ContactCard(f"First{number}", f"Last{number}",
+                                                                         "Street 1", zip_code, "City")
+        self.locator.rebuild(self.contacts)
+
+    def brute_force(self, zip_code):
+        """
+        :return: distance to every contact with coordinates, sorted list of (distance, key)
+        """
+        centre = self.coordinates[zip_code]
+        return sorted((address_book.distance_km(centre, self.coordinates[contact.zip_code]), key)
+                      for key, contact in self.contacts.items() if contact.zip_code in self.coordinates)
+
+    def test_within(self):
+        for zip_code in self.random.sample(list(self.coordinates), 20):
+            for radius_km in (0.0, 5.0, 37.5, 120.0, 2000.0):
+                expected = [result for result in self.brute_force(zip_code) if result[0] <= radius_km]
+                self.assertEqual(self.locator.within(zip_code, radius_km), expected)
+
+    def test_nearest(self):
+        for zip_code in self.random.sample(list(self.coordinates), 20):
+            expected = self.brute_force(zip_code)
+            for count in (1, 7, 50, 999, 2000):
+                self.assertEqual(self.locator.nearest(zip_code, count), expected[:count])
+
+    def test_removed_contacts_are_not_found(self):
+        zip_code = next(iter(self.coordinates))
+        for key in list(self.contacts)[:500]:
+            self.locator.remove(key, self.contacts.pop(key))
+
+        self.assertEqual(self.locator.nearest(zip_code, 2000), self.brute_force(zip_code))
+        self.assertEqual(self.locator.within(zip_code, 300.0),
+                         [result for result in self.brute_force(zip_code) if result[0] <= 300.0])
+
+    def test_no_coordinates(self):
+        locator = address_book.ContactLocator({})
+        self.assertFalse(locator.available())
+
+
+class ReadZipCodeCoordinatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "coordinates.txt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_read(self):
+        with open(self.filename, mode="w", encoding="utf-8") as file:
+            file.write("33720;61.4498;23.8570\n00100;60.1699;24.9384\n")
+
+        self.assertEqual(address_book.read_zip_code_coordinates(self.filename),
+                         {"33720": (61.4498, 23.8570), "00100": (60.1699, 24.9384)})
+
+    def test_malformed_row_names_its_line(self):
+        with open(self.filename, mode="w", encoding="utf-8") as file:
+            file.write("33720;61.4498;23.8570\n00100;north;24.9384\n")
+
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            address_book.read_zip_code_coordinates(self.filename)
+
+
+class NearbyInputTest(unittest.TestCase):
+
+    def setUp(self):
+        use_headless_widgets()
+        self.directory = tempfile.TemporaryDirectory()
+        shutil.copy(ZIPCODES_PATH, self.directory.name)
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+        with open(address_book.COORDINATES_FILENAME, mode="w", encoding="utf-8") as file:
+            file.write("33720;61.4498;23.8570\n00100;60.1699;24.9384\n")
+
+        self.gui = address_book.GUI()
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def nearby_input(self, amount, convert):
+        zip_code_entry, amount_entry = self.gui.form_entries("nearby")
+        zip_code_entry.delete(0, 'end')
+        zip_code_entry.insert(0, "33720")
+        amount_entry.delete(0, 'end')
+        amount_entry.insert(0, amount)
+        return self.gui.nearby_input(convert)
+
+    def test_valid_amount(self):
+        self.assertEqual(self.nearby_input("12.5", float), ("33720", 12.5))
+        self.assertEqual(self.nearby_input("3", int), ("33720", 3))
+
+    def test_invalid_amounts_are_refused(self):
+        for amount in ("inf", "-inf", "nan", "0", "-5", "many", ""):
+            self.assertIsNone(self.nearby_input(amount, float), amount)
+            self.assertIsNone(self.nearby_input(amount, int), amount)
+
+    def test_buttons_do_not_fail_on_infinity(self):
+        self.nearby_input("inf", float)
+        self.gui.nearby_within()
+        self.gui.nearby_nearest()
+
+
+if __name__ == "__main__":
+    unittest.main()
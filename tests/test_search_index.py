@@ -0,0 +1,110 @@
+"""
+Tests of the prefix search index of the command palette.
+"""
+
+import os
+import random
+import unittest
+
+from address_book_module import address_book, PROGRAM_FILENAME
+from stress_test import use_headless_widgets
+
+
+def contact(first_name, last_name, city="Tampere"):
+    """
+    :return: address book key and ContactCard object of a contact, (str, ContactCard)
+    """
+    return (address_book.contact_key(first_name, last_name),
+            address_book.ContactCard(first_name, last_name, "Katu 1", "33720", city))
+
+
+class ContactSearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = address_book.ContactSearchIndex()
+        self.contacts = dict([contact("Anna", "Ala"), contact("Antti", "Anttinen", "Helsinki"),
+                              contact("Sanna", "Marin", "Espoo"), contact("Bob", "Tampio")])
+        self.index.rebuild(self.contacts)
+
+    def test_search_by_either_name_order(self):
+        self.assertEqual(self.index.search("anna a"), ["ala,anna"])
+        self.assertEqual(self.index.search("ala an"), ["ala,anna"])
+        self.assertEqual(self.index.search("MARIN"), ["marin,sanna"])
+
+    def test_search_by_city(self):
+        self.assertEqual(self.index.search("hel"), ["anttinen,antti"])
+        self.assertEqual(sorted(self.index.search("tampere")), ["ala,anna", "tampio,bob"])
+
+    def test_contact_is_listed_once(self):
+        # "Anttinen Antti" and "Antti Anttinen" both start with "ant".
+        self.assertEqual(self.index.search("ant"), ["anttinen,antti"])
+
+        # Bob matches both by city and by surname, but is listed once.
+        self.assertEqual(self.index.search("tamp"), ["ala,anna", "tampio,bob"])
+
+    def test_result_count(self):
+        self.assertEqual(len(self.index.search("", count=3)), 3)
+        self.assertEqual(len(self.index.search("", count=100)), 4)
+
+    def test_add_and_remove(self):
+        key, new_contact = contact("Anneli", "Auer", "Oulu")
+        self.index.add(key, new_contact)
+        self.assertEqual(self.index.search("ann"), ["ala,anna", "auer,anneli"])
+        self.assertEqual(self.index.search("oulu"), ["auer,anneli"])
+
+        self.index.remove("ala,anna", self.contacts["ala,anna"])
+        self.assertEqual(self.index.search("ann"), ["auer,anneli"])
+        self.assertEqual(self.index.search("ala"), [])
+
+        self.index.remove(key, new_contact)
+        self.assertEqual(self.index.search("oulu"), [])
+
+    def test_many_changes_match_rebuild(self):
+        generator = random.Random(1)
+        names = ["Anna", "Antti", "Bob", "Sanna", "Sauli", "Aino", "Eino"]
+        cities = ["Tampere", "Helsinki", "Espoo", "Oulu"]
+        contacts = {}
+
+        for number in range(3000):
+            if contacts and generator.random() < 0.3:
+                key = generator.choice(list(contacts))
+                self.index.remove(key, contacts.pop(key))
+            elif generator.random() < 0.5:
+                key, new_contact = contact(generator.choice(names), f"Name{number}", generator.choice(cities))
+                contacts[key] = new_contact
+                self.index.add(key, new_contact)
+            else:
+                # Lazy loading adds the contacts in chunks.
+                chunk = [contact(generator.choice(names), f"Name{number}x{row}", generator.choice(cities))
+                         for row in range(generator.randint(1, 50))]
+                contacts.update(chunk)
+                self.index.add_many(chunk)
+
+        # The original contacts are still in the index as well.
+        contacts.update(self.contacts)
+        rebuilt_index = address_book.ContactSearchIndex()
+        rebuilt_index.rebuild(contacts)
+
+        for prefix in ["", "a", "anna", "name1", "name2", "sauli name", "tampere", "oulu", "x"]:
+            self.assertEqual(self.index.search(prefix, count=200), rebuilt_index.search(prefix, count=200))
+
+
+class PaletteShortcutTest(unittest.TestCase):
+
+    def test_shortcut_stops_other_bindings(self):
+        use_headless_widgets()
+
+        # The GUI reads the zip code table from the working directory.
+        working_directory = os.getcwd()
+        os.chdir(os.path.dirname(PROGRAM_FILENAME))
+        try:
+            gui = address_book.GUI()
+        finally:
+            os.chdir(working_directory)
+
+        # Without "break", Tk's Entry binding would delete the text after the cursor.
+        self.assertEqual(gui.palette_shortcut(), "break")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Tests of the sharded address book.
+"""
+
+import glob
+import os
+import tempfile
+import unittest
+
+from address_book_module import address_book
+
+ZIP_CODES = ["00100", "02160", "33720", "90100", "96100"]
+CITIES = {"00100": "Helsinki", "02160": "Espoo", "33720": "Tampere", "90100": "Oulu", "96100": "Rovaniemi"}
+
+
+def write_rows(filename, number_of_contacts, malformed_rows=()):
+    """
+    Writes an unsharded address book file.
+    :param filename: name of the file, str
+    :param number_of_contacts: number of contacts, int
+    :param malformed_rows: rows which cannot be loaded, list of str
+    :return: the rows of the contacts, set of str
+    """
+    rows = set()
+    for number in range(number_of_contacts):
+        zip_code = ZIP_CODES[number % len(ZIP_CODES)]
+        rows.add(f"First{number};Last{number};Street {number};{zip_code};{CITIES[zip_code]}\n")
+
+    with open(filename, mode="w", encoding="utf-8") as file:
+        file.write("".join(sorted(rows)))
+        file.write("".join(malformed_rows))
+
+    return rows
+
+
+class ShardedAddressBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "address_book.txt")
+        self.shard_directory = os.path.join(self.directory.name, "shards")
+        self.address_books = []
+
+    def tearDown(self):
+        for sharded_address_book in self.address_books:
+            sharded_address_book.close()
+        self.directory.cleanup()
+
+    def load(self, number_of_shards, partition=address_book.PARTITION_BY_SURNAME):
+        """
+        :return: the sharded address book loaded from the test directory, and its number of malformed rows
+        """
+        sharded_address_book = address_book.ShardedAddressBook(number_of_shards, partition, self.shard_directory)
+        self.address_books.append(sharded_address_book)
+        return sharded_address_book, sharded_address_book.load(self.filename)
+
+    def saved_rows(self):
+        """
+        :return: the rows of every shard file, sorted list of str
+        """
+        rows = []
+        for filename in glob.glob(os.path.join(self.shard_directory, "shard_*.txt")):
+            with open(filename, mode="r", encoding="utf-8") as file:
+                rows.extend(file.readlines())
+        return sorted(rows)
+
+    def check_shards(self, sharded_address_book):
+        """
+        Checks that every shard file has only the contacts which belong to it.
+        """
+        for shard in range(sharded_address_book.number_of_shards):
+            with open(sharded_address_book.shard_filename(shard), mode="r", encoding="utf-8") as file:
+                for row in file:
+                    contact = address_book.row_to_contact(row)
+                    self.assertEqual(sharded_address_book.shard_of(contact), shard)
+
+    def test_import_saves_shards_and_renames_file(self):
+        rows = write_rows(self.filename, 100)
+
+        sharded_address_book, _ = self.load(4)
+
+        self.assertEqual(self.saved_rows(), sorted(rows))
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(os.path.exists(self.filename + address_book.IMPORTED_SUFFIX))
+        self.check_shards(sharded_address_book)
+
+    def test_fewer_shards(self):
+        rows = write_rows(self.filename, 200)
+        self.load(5)
+
+        sharded_address_book, _ = self.load(3)
+        sharded_address_book.save()
+
+        self.assertEqual(len(glob.glob(os.path.join(self.shard_directory, "shard_*.txt"))), 3)
+        self.assertEqual(self.saved_rows(), sorted(rows))
+        self.assertEqual(list(sharded_address_book), sorted(sharded_address_book))
+        self.check_shards(sharded_address_book)
+
+    def test_more_shards(self):
+        rows = write_rows(self.filename, 200)
+        self.load(2)
+
+        sharded_address_book, _ = self.load(7)
+        sharded_address_book.save()
+
+        self.assertEqual(len(glob.glob(os.path.join(self.shard_directory, "shard_*.txt"))), 7)
+        self.assertEqual(self.saved_rows(), sorted(rows))
+        self.check_shards(sharded_address_book)
+
+    def test_surname_to_zip_region(self):
+        rows = write_rows(self.filename, 200)
+        self.load(4)
+
+        sharded_address_book, _ = self.load(4, address_book.PARTITION_BY_ZIP_REGION)
+        sharded_address_book.save()
+
+        self.assertEqual(self.saved_rows(), sorted(rows))
+        self.check_shards(sharded_address_book)
+
+    def test_malformed_rows_are_kept(self):
+        malformed_rows = ["not a contact\n", "too;many;fields;in;this;row\n"]
+        rows = write_rows(self.filename, 50, malformed_rows)
+
+        _, number_of_malformed_rows = self.load(4)
+        self.assertEqual(number_of_malformed_rows, 2)
+
+        # The malformed rows survive a change to the number of shards.
+        sharded_address_book, number_of_malformed_rows = self.load(2)
+        sharded_address_book.save()
+
+        self.assertEqual(number_of_malformed_rows, 2)
+        self.assertEqual(self.saved_rows(), sorted(rows | set(malformed_rows)))
+
+    def test_edited_contact_moves_to_its_shard(self):
+        write_rows(self.filename, 50)
+        sharded_address_book, _ = self.load(4, address_book.PARTITION_BY_ZIP_REGION)
+
+        key = address_book.contact_key("First0", "Last0")
+        contact = sharded_address_book[key]
+        sharded_address_book[key] = address_book.ContactCard(contact.first_name, contact.last_name,
+                                                             contact.address, "96100", "Rovaniemi")
+        sharded_address_book.save()
+
+        self.check_shards(sharded_address_book)
+        self.assertEqual(len(self.saved_rows()), 50)
+
+
+class ShardsArgumentTest(unittest.TestCase):
+
+    def test_positive_integer(self):
+        self.assertEqual(address_book.positive_integer("3"), 3)
+
+        for text in ("0", "-2"):
+            with self.assertRaises(address_book.argparse.ArgumentTypeError):
+                address_book.positive_integer(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
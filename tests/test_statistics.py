@@ -0,0 +1,73 @@
+"""
+Tests of the contact statistics per city and region.
+"""
+
+import random
+import unittest
+
+from address_book_module import address_book
+
+ZIP_CODES_AND_CITIES = {"00100": "Helsinki", "00170": "Helsinki", "02160": "Espoo",
+                        "33720": "Tampere", "90100": "Oulu", "96100": "Rovaniemi"}
+
+
+class AddressBookStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(1)
+
+    def random_contact(self, number):
+        zip_code = self.random.choice(list(ZIP_CODES_AND_CITIES))
+        return address_book.ContactCard(f"First{number}", f"Last{number}", "Street 1",
+                                        zip_code, ZIP_CODES_AND_CITIES[zip_code])
+
+    def assert_same_counters(self, statistics, contacts):
+        recomputed = address_book.AddressBookStatistics()
+        recomputed.recompute(contacts)
+
+        self.assertEqual(statistics.number_of_contacts, recomputed.number_of_contacts)
+        self.assertEqual(statistics.cities, recomputed.cities)
+        self.assertEqual(statistics.regions, recomputed.regions)
+
+    def test_add_and_remove_match_recompute(self):
+        statistics = address_book.AddressBookStatistics()
+        contacts = {}
+
+        for number in range(2000):
+            # The address book grows, and every third change removes a contact.
+            if contacts and self.random.random() < 1 / 3:
+                key = self.random.choice(list(contacts))
+                statistics.remove(contacts.pop(key))
+            else:
+                contacts[number] = self.random_contact(number)
+                statistics.add(contacts[number])
+
+            if number % 100 == 0:
+                self.assert_same_counters(statistics, contacts.values())
+
+        self.assert_same_counters(statistics, contacts.values())
+
+    def test_empty_cities_and_regions_are_removed(self):
+        statistics = address_book.AddressBookStatistics()
+        contact = address_book.ContactCard("Anna", "Ala", "Katu 1", "33720", "Tampere")
+
+        statistics.add(contact)
+        statistics.remove(contact)
+
+        self.assertEqual(statistics.number_of_contacts, 0)
+        self.assertEqual(statistics.cities, {})
+        self.assertEqual(statistics.regions, {})
+
+    def test_top_cities_and_regions(self):
+        statistics = address_book.AddressBookStatistics()
+        statistics.recompute([address_book.ContactCard(f"F{number}", "L", "Katu", zip_code, city)
+                              for number, (zip_code, city) in enumerate([("00100", "Helsinki"),
+                                                                         ("00170", "Helsinki"),
+                                                                         ("33720", "Tampere")])])
+
+        self.assertEqual(statistics.top_cities(1), [("Helsinki", 2)])
+        self.assertEqual(statistics.top_regions(), [("00", 2), ("33", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""
+Runs short stress tests of the GUI without a display.
+"""
+
+import os
+import unittest
+
+from address_book_module import address_book, PROGRAM_FILENAME
+from stress_test import AddressBookStressTest, HeadlessWidget, use_headless_widgets
+
+
+class StressTest(unittest.TestCase):
+
+    def setUp(self):
+        use_headless_widgets()
+
+    def test_address_book(self):
+        stress_test = AddressBookStressTest(seed=1)
+        stress_test.run(1000)
+        self.assertGreater(stress_test.operation_counts["add invalid"], 0)
+
+    def test_sharded_address_book(self):
+        stress_test = AddressBookStressTest(seed=2, shards=3)
+        stress_test.run(500)
+
+    def test_newline_is_refused(self):
+        error_message_label = HeadlessWidget()
+
+        # The GUI reads the zip code table from the working directory.
+        working_directory = os.getcwd()
+        os.chdir(os.path.dirname(PROGRAM_FILENAME))
+        try:
+            gui = address_book.GUI()
+        finally:
+            os.chdir(working_directory)
+        form_input = {"first_name": "Anna", "last_name": "Ala\nkatu", "address": "Katu 1", "zip_code": "00100"}
+
+        self.assertIsNone(gui.input_checker(form_input, error_message_label))
+        self.assertEqual(error_message_label.options["text"], "Semicolons and newlines are not allowed!")
+
+
+if __name__ == "__main__":
+    unittest.main()